@@ -0,0 +1,74 @@
+"""Cold-start benchmark for the API process.
+
+Measures, in fresh interpreters, how long `import main` takes and how long
+until the first request is answered, then lists the slowest imports.
+
+    python benchmark_startup.py --runs 5 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+FIRST_RESPONSE = """
+import time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+TestClient(main.app).get("/health/live")
+print(imported - start, time.perf_counter() - start)
+"""
+
+
+def env() -> dict:
+    # Placeholder config so main imports without a .env file
+    return {
+        "SUPABASE_URL": "https://benchmark.supabase.co",
+        "SUPABASE_KEY": "benchmark-key",
+        **os.environ,
+    }
+
+
+def measure() -> tuple:
+    output = subprocess.run(
+        [sys.executable, "-c", FIRST_RESPONSE],
+        env=env(), capture_output=True, text=True, check=True
+    ).stdout
+    imported, first_response = output.split()
+    return float(imported), float(first_response)
+
+
+def slowest_imports(top: int) -> list:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=env(), capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line[12:]:
+            continue
+        _, cumulative, name = line[12:].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    print(f"import main:         {statistics.median(r[0] for r in runs) * 1000:8.1f} ms (median of {args.runs})")
+    print(f"first response:      {statistics.median(r[1] for r in runs) * 1000:8.1f} ms (median of {args.runs})")
+    print()
+    print(f"{'cumulative':>12}  module")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"{cumulative / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
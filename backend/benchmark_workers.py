@@ -0,0 +1,156 @@
+"""Throughput benchmark for the multi-worker serving mode.
+
+Starts the API with 1..N uvicorn workers against a local stub of the
+Supabase REST API and measures requests per second on the cached
+GET /tasks read path. Load comes from wrk when it is installed, otherwise
+from several client processes, so the generator is not the bottleneck.
+
+    python benchmark_workers.py --workers 1 2 4 --duration 10
+
+Client and server share the machine's cores, so run it on a host with
+more cores than the largest worker count plus --clients.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import jwt
+
+TASKS = [
+    {"id": f"task-{i}", "title": f"Task {i}", "completed": i % 3 == 0, "user_id": "benchmark-user",
+     "created_at": "2025-01-15T10:00:00+00:00", "position": f"V{i:04d}V", "tags": []}
+    for i in range(50)
+]
+
+
+class StubUpstream(BaseHTTPRequestHandler):
+    """Answers the task list query on a cache miss; every other path is 404."""
+
+    def do_GET(self):
+        body = json.dumps(TASKS if self.path.startswith("/rest/v1/tasks") else {}).encode()
+        self.send_response(200 if self.path.startswith("/rest/v1/tasks") else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def token() -> str:
+    # The API reads claims without verifying the signature; Supabase checks it upstream
+    payload = {"sub": "benchmark-user", "email": "benchmark@example.com", "exp": time.time() + 3600}
+    return jwt.encode(payload, "benchmark-secret-benchmark-secret", algorithm="HS256")
+
+
+async def wait_until_up(url: str, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+async def hammer(url: str, headers: dict, duration: float, concurrency: int) -> int:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, headers=headers) as client:
+        deadline = time.monotonic() + duration
+        done = 0
+
+        async def worker():
+            nonlocal done
+            while time.monotonic() < deadline:
+                response = await client.get(url)
+                response.raise_for_status()
+                done += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return done
+
+
+def client_process(args: tuple) -> int:
+    return asyncio.run(hammer(*args))
+
+
+def load_with_processes(url: str, headers: dict, duration: float, concurrency: int, clients: int) -> float:
+    per_client = max(1, concurrency // clients)
+    with multiprocessing.Pool(clients) as pool:
+        done = pool.map(client_process, [(url, headers, duration, per_client)] * clients)
+    return sum(done) / duration
+
+
+def load_with_wrk(url: str, headers: dict, duration: int, concurrency: int, clients: int) -> float:
+    command = ["wrk", f"-t{clients}", f"-c{max(concurrency, clients)}", f"-d{duration}s"]
+    for name, value in headers.items():
+        command += ["-H", f"{name}: {value}"]
+    output = subprocess.run(command + [url], capture_output=True, text=True, check=True).stdout
+    if "Non-2xx" in output:
+        raise RuntimeError(f"wrk saw failed responses:\n{output}")
+    return float(re.search(r"Requests/sec:\s+([\d.]+)", output).group(1))
+
+
+def run(workers: int, port: int, upstream: str, args) -> float:
+    env = {**os.environ, "WORKERS": str(workers), "SUPABASE_URL": upstream, "SUPABASE_KEY": "benchmark-key"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        # Request logs still go to api.log; only the console copy is dropped
+        env=env, stderr=subprocess.DEVNULL
+    )
+    try:
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{port}/health/live"))
+        url = f"http://127.0.0.1:{port}/tasks"
+        headers = {"Authorization": f"Bearer {token()}"}
+        # Fills every worker's cache before the timed run
+        asyncio.run(hammer(url, headers, 1, args.concurrency))
+        load = load_with_wrk if args.client == "wrk" else load_with_processes
+        return load(url, headers, args.duration, args.concurrency, args.clients)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1,
+                        help="wrk threads or client processes")
+    parser.add_argument("--client", choices=["wrk", "processes"],
+                        default="wrk" if shutil.which("wrk") else "processes")
+    parser.add_argument("--port", type=int, default=3100)
+    args = parser.parse_args()
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubUpstream)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    upstream = f"http://127.0.0.1:{stub.server_address[1]}"
+    print(f"GET /tasks (cached), client={args.client}, clients={args.clients}, cores={os.cpu_count()}")
+
+    baseline = None
+    try:
+        for workers in args.workers:
+            rps = run(workers, args.port, upstream, args)
+            baseline = baseline or rps
+            print(f"workers={workers:<3} {rps:10.1f} req/s  x{rps / baseline:.2f}")
+    finally:
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,48 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Response, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr, field_validator
+from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse, StreamingResponse
+from pydantic import BaseModel, EmailStr, Field, ValidationError, field_validator
 from typing import Optional, List
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import contextvars
+import fcntl
+import bisect
+import csv
+import hashlib
+import heapq
+import importlib.util
+import math
+import io
+import re
+import sys
+import uuid
+import json
 import logging
 import os
-import httpx
+import socket
+import time
 from dotenv import load_dotenv
-import jwt
+
+
+def lazy_import(name: str):
+    """Registers a module that is only executed on first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# Cold starts only pay for these once a request actually talks to Supabase
+httpx = lazy_import("httpx")
+jwt = lazy_import("jwt")
 
 load_dotenv()
 
@@ -15,13 +50,700 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('api.log'),
+        logging.FileHandler('api.log', delay=True),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+REBALANCE_PAGE_SIZE = int(os.getenv("REBALANCE_PAGE_SIZE", "500"))
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "3"))
+
+WORKERS = int(os.getenv("WORKERS", "1"))
+INVALIDATION_SOCKET_DIR = os.getenv("INVALIDATION_SOCKET_DIR", "/tmp/todo-manager-bus")
+TASK_CACHE_TTL = float(os.getenv("TASK_CACHE_TTL", "30"))
+TASK_ROW_CACHE_SIZE = int(os.getenv("TASK_ROW_CACHE_SIZE", "10000"))
+USER_DIRECTORY_TTL = float(os.getenv("USER_DIRECTORY_TTL", "60"))
+REFRESH_CACHE_TTL = float(os.getenv("REFRESH_CACHE_TTL", "10"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "20"))
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+EXPORT_COLUMNS = ["id", "user_id", "title", "completed", "created_at"]
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "4"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+RANK_MAX_LENGTH = int(os.getenv("RANK_MAX_LENGTH", "16"))
+RANK_PAGE_SIZE = int(os.getenv("RANK_PAGE_SIZE", "1000"))
+
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "64"))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "256"))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "5"))
+
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "todo-manager-api")
+OTEL_EXPORT_FILE = os.getenv("OTEL_EXPORT_FILE")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+request_spans = contextvars.ContextVar("request_spans", default=None)
+span_export_tasks = set()
+span_file_lines = []
+span_file_flush = None
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_CLIENT):
+    """Times an upstream call, or with SPAN_KIND_INTERNAL, local work within the request."""
+    spans = request_spans.get()
+    if spans is None:
+        yield
+        return
+    start_ns = time.time_ns()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append({"name": name, "kind": kind, "start_ns": start_ns, "duration": time.perf_counter() - started})
+
+
+def otel_span(trace_id: str, span_id: str, parent_id: Optional[str], name: str, kind: int, start_ns: int, duration: float) -> dict:
+    return {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "parentSpanId": parent_id or "",
+        "name": name,
+        "kind": kind,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(start_ns + int(duration * 1e9))
+    }
+
+
+def append_lines(path: str, lines: list):
+    with open(path, "a") as f:
+        f.write("".join(lines))
+
+
+async def flush_span_file():
+    # Lines queued while a write is in progress go out with the next one, in a single thread hop
+    while span_file_lines:
+        lines = span_file_lines.copy()
+        span_file_lines.clear()
+        try:
+            await asyncio.to_thread(append_lines, OTEL_EXPORT_FILE, lines)
+        except OSError as e:
+            logger.warning(f"Span export failed - {type(e).__name__}")
+
+
+async def post_spans(payload: dict):
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            await client.post(f"{OTEL_EXPORTER_OTLP_ENDPOINT}/v1/traces", json=payload)
+    except httpx.HTTPError as e:
+        logger.warning(f"Span export failed - {type(e).__name__}")
+
+
+def export_spans(name: str, start_ns: int, duration: float, spans: list):
+    """Exports one request as an OTLP/JSON trace to a file and/or collector."""
+    global span_file_flush
+    trace_id = uuid.uuid4().hex
+    root_id = uuid.uuid4().hex[:16]
+    otel_spans = [otel_span(trace_id, root_id, None, name, SPAN_KIND_SERVER, start_ns, duration)]
+    for child in spans:
+        otel_spans.append(otel_span(
+            trace_id, uuid.uuid4().hex[:16], root_id, child["name"], child["kind"], child["start_ns"], child["duration"]
+        ))
+    
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": OTEL_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "todo-manager"}, "spans": otel_spans}]
+        }]
+    }
+    
+    if OTEL_EXPORT_FILE:
+        # Written from a thread, off the event loop; one flush at a time keeps lines in order
+        span_file_lines.append(json.dumps(payload) + "\n")
+        if span_file_flush is None or span_file_flush.done():
+            span_file_flush = asyncio.create_task(flush_span_file())
+    if OTEL_EXPORTER_OTLP_ENDPOINT:
+        task = asyncio.create_task(post_spans(payload))
+        span_export_tasks.add(task)
+        task.add_done_callback(span_export_tasks.discard)
+
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with span("serialize", SPAN_KIND_INTERNAL):
+            return super().render(content)
+
+caches = {}
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        # Bumped by every invalidation, so a read that overlapped a write can tell its result is stale
+        self.epoch = 0
+        self.generations = {}
+        caches[name] = self
+
+    def generation(self, key):
+        return self.epoch, self.generations.get(key, 0)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self.entries.pop(key, None)
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, generation=None):
+        """Stores value; with generation from before the read, skips it if key was invalidated since."""
+        if generation is not None and generation != self.generation(key):
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key=None, publish: bool = True):
+        if key is None or len(self.generations) >= 4 * self.maxsize:
+            # Bumping the epoch outdates every pending read, so the counters can be dropped
+            self.epoch += 1
+            self.generations.clear()
+        if key is None:
+            self.entries.clear()
+        else:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            self.entries.pop(key, None)
+        if publish:
+            invalidation_bus.publish(self.name, key)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class InvalidationProtocol(asyncio.DatagramProtocol):
+    def datagram_received(self, data, addr):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        cache = caches.get(message.get("cache"))
+        if cache is not None:
+            cache.invalidate(message.get("key"), publish=False)
+
+
+class InvalidationBus:
+    """Broadcasts cache invalidations to sibling workers over Unix datagram sockets."""
+
+    def __init__(self, directory: str, name: str = None):
+        self.directory = directory
+        self.name = name
+        self.path = None
+        self.transport = None
+        self.sender = None
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        name = self.name or f"worker-{os.getpid()}"
+        self.path = os.path.join(self.directory, f"{name}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            InvalidationProtocol,
+            local_addr=self.path,
+            family=socket.AF_UNIX
+        )
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sender.setblocking(False)
+        logger.info(f"Invalidation bus listening on {self.path}")
+
+    def stop(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        if self.sender is not None:
+            self.sender.close()
+            self.sender = None
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def publish(self, cache: str, key=None):
+        if self.sender is None:
+            return
+        message = json.dumps({"cache": cache, "key": key}).encode()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self.sender.sendto(message, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                logger.warning(f"Invalidation bus queue full for {path}, relying on TTL")
+
+
+invalidation_bus = InvalidationBus(INVALIDATION_SOCKET_DIR)
+task_list_cache = TTLCache("task_lists", TASK_CACHE_TTL)
+task_cache = TTLCache("tasks", TASK_CACHE_TTL, TASK_ROW_CACHE_SIZE)
+refresh_cache = TTLCache("refresh_sessions", REFRESH_CACHE_TTL)
+refresh_inflight = {}
+idempotency_cache = TTLCache("idempotency", IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS)
+idempotency_inflight = {}
+import_jobs = TTLCache("imports", 3600, 100)
+# Entries outlive USER_DIRECTORY_TTL so a stale directory can be served while it refreshes
+user_directory_cache = TTLCache("user_directory", USER_DIRECTORY_TTL * 10, 1)
+user_directory_inflight = {}
+analytics_cache = TTLCache("completion_analytics", ANALYTICS_CACHE_TTL, 64)
+analytics_inflight = {}
+rank_rebalance_inflight = {}
+
+
+def start_singleflight(inflight: dict, key, factory) -> asyncio.Task:
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(factory())
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    return task
+
+
+async def singleflight(inflight: dict, key, factory):
+    """Runs factory() once per key; concurrent callers await the same result."""
+    return await asyncio.shield(start_singleflight(inflight, key, factory))
+
+
+def load_task_shards() -> list:
+    """Task storage backends from TASK_SHARDS (JSON list), defaulting to the main project."""
+    raw = os.getenv("TASK_SHARDS")
+    if not raw:
+        return [{
+            "name": "primary",
+            "url": SUPABASE_URL,
+            "key": SUPABASE_KEY,
+            "service_key": os.getenv("SUPABASE_SERVICE_ROLE_KEY", SUPABASE_KEY)
+        }]
+    shards = json.loads(raw)
+    for shard in shards:
+        shard.setdefault("key", SUPABASE_KEY)
+        shard.setdefault("service_key", shard["key"])
+    return shards
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring mapping user ids to task shards."""
+
+    def __init__(self, shards: list, vnodes: int = SHARD_VNODES):
+        self.shards = shards
+        self.by_name = {shard["name"]: shard for shard in shards}
+        self.ring = sorted(
+            (ring_hash(f"{shard['name']}#{i}"), shard["name"])
+            for shard in shards
+            for i in range(vnodes)
+        )
+        self.points = [point for point, _ in self.ring]
+
+    def shard_for(self, user_id: str) -> dict:
+        index = bisect.bisect(self.points, ring_hash(user_id)) % len(self.points)
+        return self.by_name[self.ring[index][1]]
+
+
+shard_ring = HashRing(load_task_shards())
+
+
+def shard_headers(shard: dict, token: str = None) -> dict:
+    return get_supabase_headers(token, shard["key"])
+
+
+def shard_service_headers(shard: dict) -> dict:
+    return get_supabase_headers(shard["service_key"], shard["key"])
+
+
+readiness_state = {
+    "ready": False,
+    "checked_at": None,
+    "checks": {}
+}
+
+
+async def check_upstreams():
+    checks = {}
+    async with httpx.AsyncClient(timeout=HEALTH_CHECK_TIMEOUT) as client:
+        targets = [("auth", f"{SUPABASE_URL}/auth/v1/health", get_supabase_headers())]
+        for shard in shard_ring.shards:
+            name = "rest" if len(shard_ring.shards) == 1 else f"rest:{shard['name']}"
+            targets.append((name, f"{shard['url']}/rest/v1/", shard_headers(shard)))
+        for name, url, headers in targets:
+            try:
+                response = await client.get(url, headers=headers)
+                checks[name] = "OK" if response.status_code < 500 else f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                checks[name] = type(e).__name__
+
+    readiness_state["checks"] = checks
+    readiness_state["ready"] = all(status == "OK" for status in checks.values())
+    readiness_state["checked_at"] = datetime.now(timezone.utc).isoformat()
+
+
+async def readiness_loop():
+    while True:
+        previous = readiness_state["ready"]
+        try:
+            await check_upstreams()
+        except Exception as e:
+            readiness_state["ready"] = False
+            readiness_state["checks"] = {"error": type(e).__name__}
+        if readiness_state["ready"] != previous:
+            logger.info(f"Readiness changed - ready={readiness_state['ready']}, checks={readiness_state['checks']}")
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+
+async def move_rows(client: "httpx.AsyncClient", source: dict, target: dict, table: str, rows: list, source_table: str = "tasks"):
+    """Copies task rows into target's table, then deletes them from source's source_table."""
+    # Copy first, ignoring rows a previous interrupted run already copied, then delete
+    response = await client.post(
+        f"{target['url']}/rest/v1/{table}?on_conflict=id",
+        headers={
+            **shard_service_headers(target),
+            "Prefer": "return=minimal, resolution=ignore-duplicates"
+        },
+        json=rows
+    )
+    if response.status_code not in [200, 201, 204]:
+        raise RuntimeError(f"Failed to copy tasks to {target['name']}/{table}: HTTP {response.status_code}")
+    
+    ids = ",".join(row["id"] for row in rows)
+    response = await client.delete(
+        f"{source['url']}/rest/v1/{source_table}?id=in.({ids})",
+        headers=shard_service_headers(source)
+    )
+    if response.status_code not in [200, 204]:
+        raise RuntimeError(f"Failed to delete moved tasks from {source['name']}/{source_table}: HTTP {response.status_code}")
+    # Moved rows may now live in another table or shard
+    task_cache.invalidate()
+
+
+async def archive_shard(client: "httpx.AsyncClient", shard: dict, cutoff: str) -> int:
+    archived = 0
+    while True:
+        response = await client.get(
+            f"{shard['url']}/rest/v1/tasks",
+            params={
+                "select": "*",
+                "completed": "eq.true",
+                "completed_at": f"lt.{cutoff}",
+                "order": "completed_at.asc",
+                "limit": str(ARCHIVE_BATCH_SIZE)
+            },
+            headers=shard_service_headers(shard)
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to select tasks to archive: HTTP {response.status_code}")
+        
+        batch = response.json()
+        if not batch:
+            break
+        
+        await move_rows(client, shard, shard, "tasks_archive", batch)
+        
+        archived += len(batch)
+        for user_id in {task.get("user_id") for task in batch}:
+            task_list_cache.invalidate(user_id)
+        if len(batch) < ARCHIVE_BATCH_SIZE:
+            break
+    return archived
+
+
+async def archive_completed_tasks() -> int:
+    """Moves tasks completed more than ARCHIVE_AFTER_DAYS ago into tasks_archive."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+    archived = 0
+    async with httpx.AsyncClient() as client:
+        for shard in shard_ring.shards:
+            archived += await archive_shard(client, shard, cutoff)
+    return archived
+
+
+async def rebalance_shards(dry_run: bool = False) -> dict:
+    """Moves tasks and archived tasks stored on a shard other than the one their owner hashes to.
+
+    Run after changing TASK_SHARDS; returns moved row counts per "table:source->target".
+    """
+    moved = {}
+    async with httpx.AsyncClient() as client:
+        for source, table in [(shard, table) for shard in shard_ring.shards for table in ("tasks", "tasks_archive")]:
+            last_id = None
+            while True:
+                params = {"select": "*", "order": "id.asc", "limit": str(REBALANCE_PAGE_SIZE)}
+                if last_id is not None:
+                    params["id"] = f"gt.{last_id}"
+                response = await client.get(
+                    f"{source['url']}/rest/v1/{table}",
+                    params=params,
+                    headers=shard_service_headers(source)
+                )
+                if response.status_code != 200:
+                    raise RuntimeError(f"Failed to scan {source['name']}/{table}: HTTP {response.status_code}")
+                
+                rows = response.json()
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                
+                misplaced = {}
+                for row in rows:
+                    target = shard_ring.shard_for(row["user_id"])
+                    if target is not source:
+                        misplaced.setdefault(target["name"], []).append(row)
+                
+                for name, batch in misplaced.items():
+                    route = f"{table}:{source['name']}->{name}"
+                    moved[route] = moved.get(route, 0) + len(batch)
+                    if not dry_run:
+                        await move_rows(client, source, shard_ring.by_name[name], table, batch, table)
+                        for user_id in {row["user_id"] for row in batch}:
+                            task_list_cache.invalidate(user_id)
+                
+                if len(rows) < REBALANCE_PAGE_SIZE:
+                    break
+    return moved
+
+
+def try_lock(path: str) -> Optional[int]:
+    """Non-blocking exclusive flock on path; returns the held fd, or None if another process has it."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+async def archive_loop():
+    # Only the worker holding the lock archives; the OS drops it if that worker dies
+    lock = None
+    try:
+        while True:
+            if lock is None:
+                lock = try_lock(os.path.join(INVALIDATION_SOCKET_DIR, "archiver.lock"))
+                if lock is not None:
+                    logger.info(f"Worker {os.getpid()} is the archiver")
+            if lock is not None:
+                try:
+                    archived = await archive_completed_tasks()
+                    if archived:
+                        logger.info(f"Archived {archived} tasks completed more than {ARCHIVE_AFTER_DAYS} days ago")
+                except (RuntimeError, httpx.HTTPError) as e:
+                    logger.error(f"Archiving failed - {e}")
+            await asyncio.sleep(ARCHIVE_INTERVAL)
+    finally:
+        if lock is not None:
+            os.close(lock)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WORKERS > 1:
+        await invalidation_bus.start()
+    background_tasks = [asyncio.create_task(readiness_loop())]
+    if ARCHIVE_AFTER_DAYS > 0:
+        background_tasks.append(asyncio.create_task(archive_loop()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    if span_file_flush is not None and not span_file_flush.done():
+        await span_file_flush
+    invalidation_bus.stop()
+
+
+PRIORITY_CLASSES = ("health", "read", "write", "admin")
+
+
+def request_priority(method: str, path: str) -> int:
+    if path.startswith("/health"):
+        return 0
+    if path.startswith("/admin"):
+        return 3
+    if method in ("GET", "HEAD"):
+        return 1
+    return 2
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded priority wait queue."""
+
+    def __init__(self, limit: int, max_queue: int, timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.queued = 0
+        self.queued_by_priority = [0] * len(PRIORITY_CLASSES)
+        self.waiters = []
+        self.sequence = 0
+        # Per class, so a long export does not inflate the estimate for quick reads
+        self.service_times = [0.0] * len(PRIORITY_CLASSES)
+        self.admitted = {name: 0 for name in PRIORITY_CLASSES}
+        self.rejected = {name: 0 for name in PRIORITY_CLASSES}
+
+    def estimated_wait(self, priority: int = len(PRIORITY_CLASSES) - 1) -> float:
+        # Lower classes queue behind this request, so only equal or higher ones delay it
+        ahead = sum(count * self.service_times[p] for p, count in enumerate(self.queued_by_priority[:priority + 1]))
+        return (ahead + self.service_times[priority]) / self.limit
+
+    def dequeue(self, priority: int):
+        self.queued -= 1
+        self.queued_by_priority[priority] -= 1
+
+    def evict_below(self, priority: int) -> bool:
+        """Sheds the newest waiter of the lowest class below priority, if there is one."""
+        victims = [waiter for waiter in self.waiters if waiter[0] > priority and not waiter[2].done()]
+        if not victims:
+            return False
+        victim_priority, _, future = max(victims)
+        future.set_result(False)
+        self.dequeue(victim_priority)
+        return True
+
+    async def acquire(self, priority: int) -> bool:
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            self.admitted[PRIORITY_CLASSES[priority]] += 1
+            return True
+        
+        # Estimate first, so a request that will be turned away anyway evicts nobody
+        if self.estimated_wait(priority) > self.timeout or self.queued >= self.max_queue and not self.evict_below(priority):
+            self.rejected[PRIORITY_CLASSES[priority]] += 1
+            return False
+        
+        future = asyncio.get_running_loop().create_future()
+        self.sequence += 1
+        heapq.heappush(self.waiters, (priority, self.sequence, future))
+        self.queued += 1
+        self.queued_by_priority[priority] += 1
+        try:
+            admitted = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if not future.done():
+                future.cancel()
+                self.dequeue(priority)
+            elif future.result():
+                # Admitted at the same moment we gave up; hand the slot back
+                self.free_slot()
+            self.rejected[PRIORITY_CLASSES[priority]] += 1
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+        if not admitted:
+            # Evicted to make room for a higher class
+            self.rejected[PRIORITY_CLASSES[priority]] += 1
+            return False
+        self.admitted[PRIORITY_CLASSES[priority]] += 1
+        return True
+
+    def release(self, priority: int, elapsed: float):
+        previous = self.service_times[priority]
+        self.service_times[priority] = 0.9 * previous + 0.1 * elapsed if previous else elapsed
+        self.free_slot()
+
+    def free_slot(self):
+        self.active -= 1
+        while self.waiters and self.active < self.limit:
+            priority, _, future = heapq.heappop(self.waiters)
+            if future.done():
+                continue
+            self.dequeue(priority)
+            self.active += 1
+            future.set_result(True)
+
+    def metrics(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "avg_service_ms": {name: round(self.service_times[p] * 1000, 2) for p, name in enumerate(PRIORITY_CLASSES)},
+            "admitted": dict(self.admitted),
+            "rejected": dict(self.rejected)
+        }
+
+
+admission = AdmissionController(MAX_CONCURRENCY, MAX_QUEUE, QUEUE_TIMEOUT)
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        priority = request_priority(scope["method"], scope["path"])
+        if not await self.controller.acquire(priority):
+            retry_after = max(1, math.ceil(self.controller.estimated_wait(priority)))
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(retry_after).encode())
+                ]
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":{"error":"Server overloaded"}}'})
+            return
+        
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority, time.perf_counter() - started)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
+
+app.add_middleware(AdmissionMiddleware, controller=admission)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,12 +751,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browsers hide non-safelisted response headers from scripts unless listed here
+    expose_headers=["X-Total-Count", "X-Profile-Id", "Idempotent-Replayed", "ETag", "Retry-After"],
 )
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
-
 
 class UserRegister(BaseModel):
     email: EmailStr
@@ -53,8 +773,31 @@ class UserLogin(BaseModel):
     password: str
 
 
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+
+TAG_PATTERN = re.compile(r"[\w-]{1,32}")
+MAX_TAGS = 20
+
+
+def normalize_tags(tags: List[str]) -> List[str]:
+    """Lower-cased, de-duplicated tags; the charset keeps them safe inside PostgREST array literals."""
+    normalized = []
+    for tag in tags:
+        tag = tag.strip().lower()
+        if not TAG_PATTERN.fullmatch(tag):
+            raise ValueError(f'Invalid tag: {tag!r}')
+        if tag not in normalized:
+            normalized.append(tag)
+    if len(normalized) > MAX_TAGS:
+        raise ValueError(f'At most {MAX_TAGS} tags are allowed')
+    return normalized
+
+
 class TaskCreate(BaseModel):
     title: str
+    tags: List[str] = []
 
     @field_validator('title')
     @classmethod
@@ -63,10 +806,28 @@ class TaskCreate(BaseModel):
             raise ValueError('Title is required')
         return v.strip()
 
+    @field_validator('tags')
+    @classmethod
+    def tags_valid(cls, v):
+        return normalize_tags(v)
+
+
+RANK_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+RANK_PATTERN = "^[0-9A-Za-z]*[1-9A-Za-z]$"
+
 
 class TaskUpdate(BaseModel):
     completed: Optional[bool] = None
     title: Optional[str] = None
+    tags: Optional[List[str]] = None
+    # Moves name the positions of the new neighbours; None is the start or end of the list
+    after_position: Optional[str] = Field(None, pattern=RANK_PATTERN)
+    before_position: Optional[str] = Field(None, pattern=RANK_PATTERN)
+
+    @field_validator('tags')
+    @classmethod
+    def tags_valid(cls, v):
+        return None if v is None else normalize_tags(v)
 
 
 class TokenData(BaseModel):
@@ -75,18 +836,27 @@ class TokenData(BaseModel):
     role: str
 
 
-def get_supabase_headers(token: str = None):
+def get_supabase_headers(token: str = None, api_key: str = None):
+    api_key = api_key or SUPABASE_KEY
     headers = {
-        "apikey": SUPABASE_KEY,
+        "apikey": api_key,
         "Content-Type": "application/json"
     }
     if token:
         headers["Authorization"] = f"Bearer {token}"
     else:
-        headers["Authorization"] = f"Bearer {SUPABASE_KEY}"
+        headers["Authorization"] = f"Bearer {api_key}"
     return headers
 
 
+def get_service_headers():
+    return {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {os.getenv('SUPABASE_SERVICE_ROLE_KEY', SUPABASE_KEY)}",
+        "Content-Type": "application/json"
+    }
+
+
 async def get_current_user(authorization: str = Header(None)) -> TokenData:
     if not authorization:
         raise HTTPException(status_code=401, detail={"error": "No token provided"})
@@ -97,13 +867,13 @@ async def get_current_user(authorization: str = Header(None)) -> TokenData:
     token = authorization.replace("Bearer ", "")
     
     try:
-        payload = jwt.decode(token, options={"verify_signature": False})
+        with span("auth", SPAN_KIND_INTERNAL):
+            payload = jwt.decode(token, options={"verify_signature": False})
         user_id = payload.get("sub")
         email = payload.get("email")
         role = payload.get("user_role", "user")
         exp = payload.get("exp", 0)
         
-        import time
         if exp < time.time():
             raise HTTPException(status_code=401, detail={"error": "Token expired"})
         
@@ -125,6 +895,131 @@ async def require_admin(current_user: TokenData = Depends(get_current_user)) ->
     return current_user
 
 
+def profile_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+
+
+def save_profile(profile_id: str, profiler: "cProfile.Profile"):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(profile_path(profile_id))
+    profiles = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".prof")),
+        key=os.path.getmtime
+    )
+    for path in profiles[:-PROFILE_RING_SIZE]:
+        os.unlink(path)
+
+
+class ProfiledCoroutine:
+    """Awaits coro with profiler enabled only while coro itself is executing.
+
+    The profiler is switched off each time coro yields to the event loop, so other
+    requests interleaved on the same thread neither pay for it nor show up in its stats.
+    """
+
+    def __init__(self, coro, profiler):
+        self.coro = coro
+        self.profiler = profiler
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            self.profiler.enable()
+            try:
+                if error is not None:
+                    yielded = self.coro.throw(error)
+                else:
+                    yielded = self.coro.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profiler.disable()
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                self.coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+
+class ProfilingMiddleware:
+    """Runs admin requests carrying `X-Profile: 1` under cProfile."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") != b"1":
+            return await self.app(scope, receive, send)
+        
+        try:
+            current_user = await get_current_user(headers.get(b"authorization", b"").decode())
+            await require_admin(current_user)
+        except HTTPException:
+            return await self.app(scope, receive, send)
+        
+        profile_id = uuid.uuid4().hex
+        
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+        
+        logger.info(f"Profiling {scope['method']} {scope['path']} - admin={current_user.email}, profile={profile_id}")
+        import cProfile
+        profiler = cProfile.Profile()
+        # Profilers are only ever enabled for one coroutine step, so concurrent profiled requests never overlap
+        try:
+            await ProfiledCoroutine(self.app(scope, receive, send_with_profile_id), profiler)
+        finally:
+            save_profile(profile_id, profiler)
+
+
+app.add_middleware(ProfilingMiddleware)
+
+
+class ServerTimingMiddleware:
+    """Collects spans for each request into a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        spans = []
+        token = request_spans.set(spans)
+        start_ns = time.time_ns()
+        started = time.perf_counter()
+        
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings = [f"{s['name']};dur={s['duration'] * 1000:.2f}" for s in spans]
+                timings.append(f"total;dur={(time.perf_counter() - started) * 1000:.2f}")
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", ", ".join(timings).encode()),
+                    (b"timing-allow-origin", b"*")
+                ]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_spans.reset(token)
+            if OTEL_EXPORT_FILE or OTEL_EXPORTER_OTLP_ENDPOINT:
+                export_spans(f"{scope['method']} {scope['path']}", start_ns, time.perf_counter() - started, spans)
+
+
+app.add_middleware(ServerTimingMiddleware)
+
+
 @app.get("/health")
 def health():
     logger.info("Health check")
@@ -134,19 +1029,62 @@ def health():
     }
 
 
+@app.get("/health/live")
+def health_live():
+    return {"status": "OK"}
+
+
+@app.get("/health/ready")
+def health_ready():
+    status_code = 200 if readiness_state["ready"] else 503
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "status": "OK" if readiness_state["ready"] else "UNAVAILABLE",
+            "checked_at": readiness_state["checked_at"],
+            "checks": readiness_state["checks"]
+        }
+    )
+
+
+def token_role(access_token: str) -> str:
+    try:
+        payload = jwt.decode(access_token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+        return payload.get("user_role", "user")
+    except:
+        return "user"
+
+
+def session_response(data: dict) -> dict:
+    access_token = data.get("access_token")
+    user_data = data.get("user", {})
+    
+    return {
+        "token": access_token,
+        "refresh_token": data.get("refresh_token"),
+        "expires_in": data.get("expires_in"),
+        "user": {
+            "id": user_data.get("id"),
+            "email": user_data.get("email"),
+            "role": token_role(access_token)
+        }
+    }
+
+
 @app.post("/auth/register", status_code=201)
 async def register(user: UserRegister):
     logger.info(f"POST /auth/register - email={user.email}")
     
     async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{SUPABASE_URL}/auth/v1/signup",
-            headers=get_supabase_headers(),
-            json={
-                "email": user.email,
-                "password": user.password
-            }
-        )
+        with span("signup"):
+            response = await client.post(
+                f"{SUPABASE_URL}/auth/v1/signup",
+                headers=get_supabase_headers(),
+                json={
+                    "email": user.email,
+                    "password": user.password
+                }
+            )
         
         if response.status_code == 400:
             error_data = response.json()
@@ -176,14 +1114,15 @@ async def login(user: UserLogin):
     logger.info(f"POST /auth/login - email={user.email}")
     
     async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{SUPABASE_URL}/auth/v1/token?grant_type=password",
-            headers=get_supabase_headers(),
-            json={
-                "email": user.email,
-                "password": user.password
-            }
-        )
+        with span("token"):
+            response = await client.post(
+                f"{SUPABASE_URL}/auth/v1/token?grant_type=password",
+                headers=get_supabase_headers(),
+                json={
+                    "email": user.email,
+                    "password": user.password
+                }
+            )
         
         if response.status_code == 400:
             raise HTTPException(status_code=401, detail={"error": "Invalid credentials"})
@@ -191,79 +1130,429 @@ async def login(user: UserLogin):
         if response.status_code != 200:
             raise HTTPException(status_code=401, detail={"error": "Invalid credentials"})
         
-        data = response.json()
-        access_token = data.get("access_token")
-        user_data = data.get("user", {})
+        return session_response(response.json())
+
+
+async def refresh_session(refresh_token: str) -> dict:
+    async with httpx.AsyncClient() as client:
+        with span("refresh"):
+            response = await client.post(
+                f"{SUPABASE_URL}/auth/v1/token?grant_type=refresh_token",
+                headers=get_supabase_headers(),
+                json={"refresh_token": refresh_token}
+            )
         
-        try:
-            payload = jwt.decode(access_token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience="authenticated")
-            role = payload.get("user_role", "user")
-        except:
-            role = "user"
+        if response.status_code != 200:
+            raise HTTPException(status_code=401, detail={"error": "Invalid refresh token"})
         
-        return {
-            "token": access_token,
-            "user": {
-                "id": user_data.get("id"),
-                "email": user_data.get("email"),
-                "role": role
+        return session_response(response.json())
+
+
+@app.post("/auth/refresh")
+async def refresh(body: TokenRefresh):
+    logger.info("POST /auth/refresh")
+    
+    # Several tabs refreshing with the same token share one upstream grant
+    key = hashlib.sha256(body.refresh_token.encode()).hexdigest()
+    cached = refresh_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    session = await singleflight(refresh_inflight, key, lambda: refresh_session(body.refresh_token))
+    refresh_cache.set(key, session)
+    return session
+
+
+def rank_between(before: Optional[str], after: Optional[str]) -> str:
+    """Base-62 fraction key sorting strictly between before and after (None for an open end)."""
+    if before and after and before >= after:
+        raise ValueError("before must sort below after")
+    if not before and not after:
+        return RANK_DIGITS[len(RANK_DIGITS) // 2]
+    if not before:
+        # Step the leading digit down so repeated moves to the top grow keys slowly
+        digit = RANK_DIGITS.index(after[0])
+        if digit > 1:
+            return RANK_DIGITS[digit - 1]
+        return "0z" if digit == 1 else "0" + rank_between(None, after[1:])
+    if not after:
+        digit = RANK_DIGITS.index(before[0])
+        if digit < len(RANK_DIGITS) - 1:
+            return RANK_DIGITS[digit + 1]
+        return "z" + (rank_between(before[1:], None) if before[1:] else "1")
+    
+    key = ""
+    bounded = True
+    for i in range(max(len(before), len(after)) + 1):
+        low = RANK_DIGITS.index(before[i]) if i < len(before) else 0
+        high = RANK_DIGITS.index(after[i]) if bounded and i < len(after) else len(RANK_DIGITS)
+        if low == high:
+            key += RANK_DIGITS[low]
+            continue
+        middle = (low + high) // 2
+        if middle > low:
+            return key + RANK_DIGITS[middle]
+        # Adjacent digits: keep before's digit and look for room in the digits after it
+        key += RANK_DIGITS[low]
+        bounded = False
+    return key + RANK_DIGITS[len(RANK_DIGITS) // 2]
+
+
+def spread_ranks(count: int) -> list:
+    """count evenly spaced keys, short and with room for ~16 moves between neighbours."""
+    width = 1
+    while len(RANK_DIGITS) ** width < 16 * (count + 1):
+        width += 1
+    step = len(RANK_DIGITS) ** width // (count + 1)
+    keys = []
+    for i in range(1, count + 1):
+        value = i * step
+        digits = ""
+        for _ in range(width):
+            value, digit = divmod(value, len(RANK_DIGITS))
+            digits = RANK_DIGITS[digit] + digits
+        keys.append(digits.rstrip("0"))
+    return keys
+
+
+async def rebalance_positions(user_id: str) -> int:
+    """Respaces a user's position keys in their current order; returns the number of tasks moved."""
+    shard = shard_ring.shard_for(user_id)
+    async with httpx.AsyncClient() as client:
+        # Keyset pages, since a single read is cut short at the upstream max-rows and the
+        # unread tail would then sort in among the respaced keys
+        tasks = []
+        while True:
+            params = {
+                "user_id": f"eq.{user_id}",
+                "select": "id,position",
+                "order": "position.asc,id.asc",
+                "limit": str(RANK_PAGE_SIZE)
             }
-        }
+            if tasks:
+                last = tasks[-1]
+                params["or"] = f"(position.gt.{last['position']},and(position.eq.{last['position']},id.gt.{last['id']}))"
+            response = await client.get(
+                f"{shard['url']}/rest/v1/tasks",
+                params=params,
+                headers=shard_service_headers(shard)
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"Failed to read positions for {user_id}: HTTP {response.status_code}")
+            
+            rows = response.json()
+            tasks.extend(rows)
+            if len(rows) < RANK_PAGE_SIZE:
+                break
+        
+        moves = [
+            {"id": task["id"], "old_position": task["position"], "new_position": key}
+            for task, key in zip(tasks, spread_ranks(len(tasks)))
+            if task["position"] != key
+        ]
+        moved = 0
+        for start in range(0, len(moves), RANK_PAGE_SIZE):
+            # One call per page; each move is conditional on the old key, so a move made meanwhile is not overwritten
+            response = await client.post(
+                f"{shard['url']}/rest/v1/rpc/move_task_positions",
+                headers=shard_service_headers(shard),
+                json={"moves": moves[start:start + RANK_PAGE_SIZE]}
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"Failed to move positions for {user_id}: HTTP {response.status_code}")
+            moved += len(response.json())
+    
+    if moved:
+        # Dropping the whole row cache is one bus message instead of one per moved task
+        task_cache.invalidate()
+    task_list_cache.invalidate(user_id)
+    logger.info(f"Rebalanced positions for {user_id} - moved={moved}")
+    return moved
+
+
+def log_rebalance_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Position rebalance failed - {task.exception()}")
+
+
+def check_rank_length(task: dict):
+    """Schedules a background rebalance once a task's key has grown past RANK_MAX_LENGTH."""
+    if len(task.get("position") or "") > RANK_MAX_LENGTH:
+        user_id = task["user_id"]
+        rebalance = start_singleflight(rank_rebalance_inflight, user_id, lambda: rebalance_positions(user_id))
+        rebalance.add_done_callback(log_rebalance_failure)
+
+
+TASK_ORDERS = {
+    "created_at": ("created_at.desc", lambda task: task.get("created_at") or "", True),
+    "position": ("position.asc,created_at.desc", lambda task: task.get("position") or "", False)
+}
+
+
+def has_tags(task: dict, tags: tuple, match: str) -> bool:
+    task_tags = task.get("tags") or []
+    test = all if match == "all" else any
+    return test(tag in task_tags for tag in tags)
 
 
 @app.get("/tasks")
 async def get_tasks(
+    sort: str = Query("created_at", pattern="^(created_at|position)$"),
+    tag: List[str] = Query([]),
+    match: str = Query("any", pattern="^(any|all)$"),
     current_user: TokenData = Depends(get_current_user),
     authorization: str = Header(None)
 ):
-    logger.info(f"GET /tasks - user={current_user.email}, role={current_user.role}")
+    logger.info(f"GET /tasks - user={current_user.email}, role={current_user.role}, sort={sort}, tags={tag}")
     token = authorization.replace("Bearer ", "")
+    order, merge_key, descending = TASK_ORDERS[sort]
+    try:
+        tags = tuple(sorted(normalize_tags(tag)))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail={"error": str(error)})
+    view = (sort, match, tags) if tags else sort
+    
+    # Admins see every user's tasks, so only per-user lists are cached
+    cacheable = current_user.role != "admin"
+    generation = task_list_cache.generation(current_user.user_id)
+    if cacheable:
+        cached = task_list_cache.get(current_user.user_id) or {}
+        if view in cached:
+            return cached[view]
+        if sort in cached:
+            # The full list is already here, so filtering it beats another upstream query
+            return [task for task in cached[sort] if has_tags(task, tags, match)]
+    
+    # overlaps (any) and contains (all) are both served by the GIN index on tags
+    tag_filter = f"&tags={'cs' if match == 'all' else 'ov'}.{{{','.join(tags)}}}" if tags else ""
+    
+    # Admins read every shard concurrently and merge the already-sorted lists
+    shards = shard_ring.shards if current_user.role == "admin" else [shard_ring.shard_for(current_user.user_id)]
     
     async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{SUPABASE_URL}/rest/v1/tasks?select=*&order=created_at.desc",
-            headers=get_supabase_headers(token)
-        )
+        with span("fetch"):
+            responses = await asyncio.gather(*(
+                client.get(
+                    f"{shard['url']}/rest/v1/tasks?select=*&order={order}{tag_filter}",
+                    headers=shard_headers(shard, token)
+                )
+                for shard in shards
+            ))
         
-        if response.status_code != 200:
+        if any(response.status_code != 200 for response in responses):
             raise HTTPException(status_code=500, detail={"error": "Failed to fetch tasks"})
         
-        tasks = response.json()
+        if len(responses) == 1:
+            tasks = responses[0].json()
+        else:
+            tasks = list(heapq.merge(
+                *(response.json() for response in responses),
+                key=merge_key,
+                reverse=descending
+            ))
+        if sort == "position":
+            for task in tasks:
+                check_rank_length(task)
+        if cacheable:
+            # Every view lives under the user's key so existing invalidations cover them
+            task_list_cache.set(
+                current_user.user_id,
+                {**(task_list_cache.get(current_user.user_id) or {}), view: tasks},
+                generation
+            )
         return tasks
 
 
-@app.post("/tasks", status_code=201)
-async def create_task(
-    task: TaskCreate,
+@app.get("/tasks/archive")
+async def get_archived_tasks(
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=200),
     current_user: TokenData = Depends(get_current_user),
     authorization: str = Header(None)
 ):
-    logger.info(f"POST /tasks - user={current_user.email}, title={task.title}")
+    logger.info(f"GET /tasks/archive - user={current_user.email}, page={page}")
     token = authorization.replace("Bearer ", "")
     
+    shard = shard_ring.shard_for(current_user.user_id)
+    
     async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{SUPABASE_URL}/rest/v1/tasks",
-            headers={
-                **get_supabase_headers(token),
-                "Prefer": "return=representation"
-            },
-            json={
-                "title": task.title,
-                "completed": False,
-                "user_id": current_user.user_id
-            }
-        )
+        with span("fetch"):
+            response = await client.get(
+                f"{shard['url']}/rest/v1/tasks_archive?select=*&order=completed_at.desc"
+                f"&limit={limit}&offset={(page - 1) * limit}",
+                headers=shard_headers(shard, token)
+            )
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=500, detail={"error": "Failed to fetch archived tasks"})
+        
+        return response.json()
+
+
+@app.get("/tasks/tags")
+async def get_task_tags(
+    current_user: TokenData = Depends(get_current_user),
+    authorization: str = Header(None)
+):
+    logger.info(f"GET /tasks/tags - user={current_user.email}")
+    token = authorization.replace("Bearer ", "")
+    
+    generation = task_list_cache.generation(current_user.user_id)
+    cached = task_list_cache.get(current_user.user_id) or {}
+    if "tags" in cached:
+        return cached["tags"]
+    
+    shard = shard_ring.shard_for(current_user.user_id)
+    async with httpx.AsyncClient() as client:
+        with span("fetch"):
+            # Counts are maintained by a trigger on tasks, so this never scans the tasks themselves
+            response = await client.get(
+                f"{shard['url']}/rest/v1/task_tag_counts?user_id=eq.{current_user.user_id}"
+                f"&task_count=gt.0&select=tag,task_count&order=task_count.desc,tag.asc",
+                headers=shard_headers(shard, token)
+            )
+        
+        if response.status_code != 200:
+            raise HTTPException(status_code=500, detail={"error": "Failed to fetch tags"})
+    
+    tags = [{"tag": row["tag"], "count": row["task_count"]} for row in response.json()]
+    task_list_cache.set(
+        current_user.user_id,
+        {**(task_list_cache.get(current_user.user_id) or {}), "tags": tags},
+        generation
+    )
+    return tags
+
+
+async def insert_task(task: TaskCreate, current_user: TokenData, token: str):
+    shard = shard_ring.shard_for(current_user.user_id)
+    async with httpx.AsyncClient() as client:
+        with span("insert"):
+            response = await client.post(
+                f"{shard['url']}/rest/v1/tasks",
+                headers={
+                    **shard_headers(shard, token),
+                    "Prefer": "return=representation"
+                },
+                json={
+                    "title": task.title,
+                    "completed": False,
+                    "tags": task.tags,
+                    "user_id": current_user.user_id
+                }
+            )
         
         if response.status_code not in [200, 201]:
             raise HTTPException(status_code=400, detail={"error": "Failed to create task"})
         
+        task_list_cache.invalidate(current_user.user_id)
         tasks = response.json()
         if isinstance(tasks, list) and len(tasks) > 0:
+            # The insert trigger keys new tasks above the user's first one
+            check_rank_length(tasks[0])
+            task_cache.set(tasks[0]["id"], tasks[0])
             return tasks[0]
         return tasks
 
 
+@app.post("/tasks", status_code=201)
+async def create_task(
+    task: TaskCreate,
+    response: Response,
+    current_user: TokenData = Depends(get_current_user),
+    authorization: str = Header(None),
+    idempotency_key: Optional[str] = Header(None)
+):
+    logger.info(f"POST /tasks - user={current_user.email}, title={task.title}")
+    token = authorization.replace("Bearer ", "")
+    
+    if idempotency_key is None:
+        return await insert_task(task, current_user, token)
+    
+    key = (current_user.user_id, idempotency_key)
+    fingerprint = hashlib.sha256(task.model_dump_json().encode()).hexdigest()
+    replayed = True
+    
+    async def insert_once():
+        nonlocal replayed
+        replayed = False
+        created = await insert_task(task, current_user, token)
+        idempotency_cache.set(key, (fingerprint, created))
+        return fingerprint, created
+    
+    stored = idempotency_cache.get(key)
+    if stored is None:
+        stored = await singleflight(idempotency_inflight, key, insert_once)
+    
+    stored_fingerprint, created = stored
+    if stored_fingerprint != fingerprint:
+        raise HTTPException(status_code=422, detail={"error": "Idempotency key reused with a different request"})
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return created
+
+
+async def find_task(client: "httpx.AsyncClient", task_id: str, current_user: TokenData, token: str):
+    """Returns (shard, task) for task_id; admins search every shard, users only their own."""
+    cached = task_cache.get(task_id)
+    if cached is not None:
+        # The cache is shared across users; answer non-owners as their RLS-filtered read would
+        if current_user.role != "admin" and cached["user_id"] != current_user.user_id:
+            raise HTTPException(status_code=404, detail={"error": "Task not found"})
+        return shard_ring.shard_for(cached["user_id"]), cached
+    
+    generation = task_cache.generation(task_id)
+    shards = shard_ring.shards if current_user.role == "admin" else [shard_ring.shard_for(current_user.user_id)]
+    
+    with span("check"):
+        responses = await asyncio.gather(*(
+            client.get(
+                f"{shard['url']}/rest/v1/tasks?id=eq.{task_id}&select=*",
+                headers=shard_headers(shard, token)
+            )
+            for shard in shards
+        ))
+    
+    for shard, response in zip(shards, responses):
+        if response.status_code != 200:
+            raise HTTPException(status_code=500, detail={"error": "Failed to check task"})
+        tasks = response.json()
+        if tasks:
+            task_cache.set(task_id, tasks[0], generation)
+            return shard, tasks[0]
+    
+    raise HTTPException(status_code=404, detail={"error": "Task not found"})
+
+
+def task_etag(task: dict) -> str:
+    return '"' + hashlib.sha256(json.dumps(task, sort_keys=True).encode()).hexdigest()[:32] + '"'
+
+
+@app.get("/tasks/{task_id}")
+async def get_task(
+    task_id: str,
+    response: Response,
+    current_user: TokenData = Depends(get_current_user),
+    authorization: str = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    logger.info(f"GET /tasks/{task_id} - user={current_user.email}")
+    token = authorization.replace("Bearer ", "")
+    
+    async with httpx.AsyncClient() as client:
+        _, task = await find_task(client, task_id, current_user, token)
+    
+    if current_user.role != "admin" and task.get("user_id") != current_user.user_id:
+        raise HTTPException(status_code=403, detail={"error": "Access denied"})
+    
+    etag = task_etag(task)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return task
+
+
 @app.patch("/tasks/{task_id}")
 async def update_task(
     task_id: str,
@@ -275,19 +1564,7 @@ async def update_task(
     token = authorization.replace("Bearer ", "")
     
     async with httpx.AsyncClient() as client:
-        check_response = await client.get(
-            f"{SUPABASE_URL}/rest/v1/tasks?id=eq.{task_id}&select=*",
-            headers=get_supabase_headers(token)
-        )
-        
-        if check_response.status_code != 200:
-            raise HTTPException(status_code=500, detail={"error": "Failed to check task"})
-        
-        tasks = check_response.json()
-        if not tasks:
-            raise HTTPException(status_code=404, detail={"error": "Task not found"})
-        
-        existing_task = tasks[0]
+        shard, existing_task = await find_task(client, task_id, current_user, token)
         
         if current_user.role != "admin" and existing_task.get("user_id") != current_user.user_id:
             raise HTTPException(status_code=403, detail={"error": "Access denied"})
@@ -295,23 +1572,40 @@ async def update_task(
         update_data = {}
         if task.completed is not None:
             update_data["completed"] = task.completed
+            # Re-sending completed: true must not restart the archive countdown
+            if task.completed != existing_task.get("completed"):
+                update_data["completed_at"] = datetime.now(timezone.utc).isoformat() if task.completed else None
         if task.title is not None:
             update_data["title"] = task.title
+        if task.tags is not None:
+            update_data["tags"] = task.tags
+        if {"after_position", "before_position"} & task.model_fields_set:
+            # A move rewrites only this row's key, whatever the length of the list
+            try:
+                update_data["position"] = rank_between(task.after_position, task.before_position)
+            except ValueError:
+                raise HTTPException(status_code=400, detail={"error": "after_position must sort before before_position"})
         
-        response = await client.patch(
-            f"{SUPABASE_URL}/rest/v1/tasks?id=eq.{task_id}",
-            headers={
-                **get_supabase_headers(token),
-                "Prefer": "return=representation"
-            },
-            json=update_data
-        )
+        with span("patch"):
+            response = await client.patch(
+                f"{shard['url']}/rest/v1/tasks?id=eq.{task_id}",
+                headers={
+                    **shard_headers(shard, token),
+                    "Prefer": "return=representation"
+                },
+                json=update_data
+            )
         
         if response.status_code not in [200, 204]:
             raise HTTPException(status_code=400, detail={"error": "Failed to update task"})
         
+        task_list_cache.invalidate(existing_task.get("user_id"))
+        # Siblings drop their copy; this worker keeps the fresh representation
+        task_cache.invalidate(task_id)
         updated_tasks = response.json()
         if isinstance(updated_tasks, list) and len(updated_tasks) > 0:
+            check_rank_length(updated_tasks[0])
+            task_cache.set(task_id, updated_tasks[0])
             return updated_tasks[0]
         return updated_tasks
 
@@ -326,49 +1620,119 @@ async def delete_task(
     token = authorization.replace("Bearer ", "")
     
     async with httpx.AsyncClient() as client:
-        check_response = await client.get(
-            f"{SUPABASE_URL}/rest/v1/tasks?id=eq.{task_id}&select=*",
-            headers=get_supabase_headers(token)
-        )
-        
-        if check_response.status_code != 200:
-            raise HTTPException(status_code=500, detail={"error": "Failed to check task"})
-        
-        tasks = check_response.json()
-        if not tasks:
-            raise HTTPException(status_code=404, detail={"error": "Task not found"})
-        
-        existing_task = tasks[0]
+        shard, existing_task = await find_task(client, task_id, current_user, token)
         
         if current_user.role != "admin" and existing_task.get("user_id") != current_user.user_id:
             raise HTTPException(status_code=403, detail={"error": "Access denied"})
         
-        response = await client.delete(
-            f"{SUPABASE_URL}/rest/v1/tasks?id=eq.{task_id}",
-            headers=get_supabase_headers(token)
-        )
+        with span("delete"):
+            response = await client.delete(
+                f"{shard['url']}/rest/v1/tasks?id=eq.{task_id}",
+                headers=shard_headers(shard, token)
+            )
         
         if response.status_code not in [200, 204]:
             raise HTTPException(status_code=400, detail={"error": "Failed to delete task"})
         
+        task_list_cache.invalidate(existing_task.get("user_id"))
+        task_cache.invalidate(task_id)
         return None
 
 
-@app.get("/admin/users")
-async def get_users(current_user: TokenData = Depends(require_admin)):
-    logger.info(f"GET /admin/users - admin={current_user.email}")
+async def count_sharded_tasks(client: "httpx.AsyncClient") -> dict:
+    """Per-user task counts summed over shards, one grouped query per shard."""
+    # An RPC rather than select=user_id,count(): PostgREST aggregates are off by default
+    with span("counts"):
+        responses = await asyncio.gather(*(
+            client.post(
+                f"{shard['url']}/rest/v1/rpc/task_counts_by_user",
+                headers=shard_service_headers(shard),
+                json={}
+            )
+            for shard in shard_ring.shards
+        ))
     
+    counts = {}
+    for response in responses:
+        if response.status_code != 200:
+            raise HTTPException(status_code=500, detail={"error": "Failed to count tasks"})
+        for row in response.json():
+            counts[row["user_id"]] = counts.get(row["user_id"], 0) + row["task_count"]
+    return counts
+
+
+async def load_user_directory() -> dict:
+    generation = user_directory_cache.generation("directory")
+    sharded = len(shard_ring.shards) > 1
     async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{SUPABASE_URL}/rest/v1/profiles?select=*",
-            headers=get_supabase_headers()
-        )
+        with span("profiles"):
+            # Unsharded, tasks(count) is aggregated by PostgREST in the same query
+            response = await client.get(
+                f"{SUPABASE_URL}/rest/v1/profiles?select=*" + ("" if sharded else ",tasks(count)"),
+                headers=get_service_headers()
+            )
         
         if response.status_code != 200:
             raise HTTPException(status_code=500, detail={"error": "Failed to fetch users"})
         
-        profiles = response.json()
-        return profiles
+        users = response.json()
+        sharded_counts = await count_sharded_tasks(client) if sharded else None
+    
+    for user in users:
+        if sharded:
+            user["task_count"] = sharded_counts.get(user.get("id"), 0)
+        else:
+            counts = user.pop("tasks", None) or [{}]
+            user["task_count"] = counts[0].get("count", 0)
+    users.sort(key=lambda user: (user.get("email") or "").lower())
+    
+    directory = {
+        "loaded_at": time.monotonic(),
+        "users": users,
+        "emails": [(user.get("email") or "").lower() for user in users],
+        "by_id": {user.get("id"): user for user in users}
+    }
+    user_directory_cache.set("directory", directory, generation)
+    return directory
+
+
+def log_refresh_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"User directory refresh failed - {task.exception()}")
+
+
+async def get_user_directory() -> dict:
+    directory = user_directory_cache.get("directory")
+    if directory is None:
+        return await singleflight(user_directory_inflight, "directory", load_user_directory)
+    
+    if time.monotonic() - directory["loaded_at"] > USER_DIRECTORY_TTL:
+        refresh = start_singleflight(user_directory_inflight, "directory", load_user_directory)
+        refresh.add_done_callback(log_refresh_failure)
+    return directory
+
+
+@app.get("/admin/users")
+async def get_users(
+    response: Response,
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=500),
+    search: Optional[str] = None,
+    current_user: TokenData = Depends(require_admin)
+):
+    logger.info(f"GET /admin/users - admin={current_user.email}, page={page}, search={search}")
+    
+    directory = await get_user_directory()
+    start, end = 0, len(directory["users"])
+    if search:
+        # Emails are sorted, so a prefix match is a contiguous slice
+        prefix = search.lower()
+        start = bisect.bisect_left(directory["emails"], prefix)
+        end = bisect.bisect_left(directory["emails"], prefix + "\uffff", lo=start)
+    
+    response.headers["X-Total-Count"] = str(end - start)
+    offset = start + (page - 1) * limit
+    return directory["users"][offset:min(offset + limit, end)]
 
 
 @app.delete("/admin/users/{user_id}", status_code=204)
@@ -379,33 +1743,451 @@ async def delete_user(
     logger.info(f"DELETE /admin/users/{user_id} - admin={current_user.email}")
     
     async with httpx.AsyncClient() as client:
-        check_response = await client.get(
-            f"{SUPABASE_URL}/rest/v1/profiles?id=eq.{user_id}&select=*",
-            headers=get_supabase_headers()
-        )
+        # Stale snapshots are kept for serving the list, not for vouching that a user still exists
+        directory = user_directory_cache.get("directory")
+        fresh = directory is not None and time.monotonic() - directory["loaded_at"] <= USER_DIRECTORY_TTL
+        if not fresh or user_id not in directory["by_id"]:
+            with span("check"):
+                check_response = await client.get(
+                    f"{SUPABASE_URL}/rest/v1/profiles?id=eq.{user_id}&select=*",
+                    headers=get_supabase_headers()
+                )
+            
+            if check_response.status_code != 200:
+                raise HTTPException(status_code=500, detail={"error": "Failed to check user"})
+            
+            profiles = check_response.json()
+            if not profiles:
+                raise HTTPException(status_code=404, detail={"error": "User not found"})
         
-        if check_response.status_code != 200:
-            raise HTTPException(status_code=500, detail={"error": "Failed to check user"})
+        # The auth cascade reaches only the primary project's tasks; the archive has no foreign key
+        shard = shard_ring.shard_for(user_id)
+        tables = ("tasks", "tasks_archive") if len(shard_ring.shards) > 1 else ("tasks_archive",)
+        with span("shard_delete"):
+            responses = await asyncio.gather(*(
+                client.delete(
+                    f"{shard['url']}/rest/v1/{table}?user_id=eq.{user_id}",
+                    headers=shard_service_headers(shard)
+                )
+                for table in tables
+            ))
+        if any(response.status_code not in [200, 204] for response in responses):
+            raise HTTPException(status_code=500, detail={"error": "Failed to delete user's tasks"})
         
-        profiles = check_response.json()
-        if not profiles:
-            raise HTTPException(status_code=404, detail={"error": "User not found"})
+        with span("delete"):
+            response = await client.delete(
+                f"{SUPABASE_URL}/auth/v1/admin/users/{user_id}",
+                headers=get_service_headers()
+            )
         
-        response = await client.delete(
-            f"{SUPABASE_URL}/auth/v1/admin/users/{user_id}",
+        if response.status_code not in [200, 204]:
+            raise HTTPException(status_code=400, detail={"error": "Failed to delete user"})
+        
+        task_list_cache.invalidate(user_id)
+        task_cache.invalidate()
+        user_directory_cache.invalidate("directory")
+        return None
+
+
+async def fetch_task_page(client: "httpx.AsyncClient", shard: dict, token: str, filters: list, offset: int) -> list:
+    with span("page"):
+        response = await client.get(
+            f"{shard['url']}/rest/v1/tasks",
+            params=[("select", "*"), ("order", "created_at.asc,id.asc"), *filters],
             headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {os.getenv('SUPABASE_SERVICE_ROLE_KEY', SUPABASE_KEY)}",
-                "Content-Type": "application/json"
+                **shard_headers(shard, token),
+                "Range-Unit": "items",
+                "Range": f"{offset}-{offset + EXPORT_PAGE_SIZE - 1}"
             }
         )
+    
+    if response.status_code not in [200, 206]:
+        raise HTTPException(status_code=500, detail={"error": "Failed to fetch tasks"})
+    return response.json()
+
+
+def format_rows(rows: list, format: str) -> str:
+    if format == "ndjson":
+        return "".join(json.dumps(row) + "\n" for row in rows)
+    
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writerows(rows)
+    return output.getvalue()
+
+
+@app.get("/admin/tasks/export")
+async def export_tasks(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    user_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    current_user: TokenData = Depends(require_admin),
+    authorization: str = Header(None)
+):
+    logger.info(f"GET /admin/tasks/export - admin={current_user.email}, format={format}")
+    token = authorization.replace("Bearer ", "")
+    
+    filters = []
+    if user_id:
+        filters.append(("user_id", f"eq.{user_id}"))
+    if created_from:
+        filters.append(("created_at", f"gte.{created_from.isoformat()}"))
+    if created_to:
+        filters.append(("created_at", f"lt.{created_to.isoformat()}"))
+    
+    # Shards are exported one after another, each in created_at order
+    shards = [shard_ring.shard_for(user_id)] if user_id else shard_ring.shards
+    
+    client = httpx.AsyncClient()
+    try:
+        # The first page is fetched up front so upstream failures still map to an error status
+        first_page = await fetch_task_page(client, shards[0], token, filters, 0)
+    except BaseException:
+        await client.aclose()
+        raise
+    
+    async def stream_rows():
+        offset = 0
+        try:
+            if format == "csv":
+                yield ",".join(EXPORT_COLUMNS) + "\r\n"
+            for shard in shards:
+                offset = 0
+                rows = first_page if shard is shards[0] else await fetch_task_page(client, shard, token, filters, 0)
+                while rows:
+                    yield format_rows(rows, format)
+                    if len(rows) < EXPORT_PAGE_SIZE:
+                        break
+                    offset += EXPORT_PAGE_SIZE
+                    rows = await fetch_task_page(client, shard, token, filters, offset)
+        except HTTPException as e:
+            logger.error(f"Export aborted at offset {offset} - admin={current_user.email}")
+            # Headers are already sent; failing the response aborts the connection, so the client
+            # sees an incomplete transfer instead of a clean end of file
+            raise RuntimeError(f"Export aborted at offset {offset}") from e
+        finally:
+            await client.aclose()
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        stream_rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=tasks.{format}"}
+    )
+
+
+async def iter_lines(stream):
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def iter_import_rows(stream, format: str):
+    header = None
+    row_number = 0
+    async for raw_line in iter_lines(stream):
+        try:
+            line = raw_line.decode("utf-8-sig").strip()
+        except UnicodeDecodeError:
+            line = None
+        if line == "":
+            continue
+        if format == "csv" and header is None:
+            if line is None:
+                raise ValueError("CSV header is not valid UTF-8")
+            header = next(csv.reader([line]))
+            continue
+        row_number += 1
+        try:
+            if line is None:
+                raise ValueError("Row is not valid UTF-8")
+            if format == "csv":
+                row = dict(zip(header, next(csv.reader([line]))))
+            else:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("Row must be a JSON object")
+        except ValueError as e:
+            yield row_number, None, str(e)
+            continue
+        yield row_number, row, None
+
+
+def parse_import_row(row: dict) -> dict:
+    try:
+        task = TaskCreate(title=row.get("title") or "")
+    except ValidationError as e:
+        raise ValueError(e.errors()[0]["msg"].removeprefix("Value error, "))
+    
+    if not row.get("user_id"):
+        raise ValueError("user_id is required")
+    if not isinstance(row["user_id"], str):
+        raise ValueError("user_id must be a string")
+    
+    completed = row.get("completed", False)
+    if isinstance(completed, str):
+        completed = completed.strip().lower() in ("true", "1", "yes")
+    
+    record = {
+        "title": task.title,
+        "completed": bool(completed),
+        "user_id": row["user_id"]
+    }
+    # Missing timestamps fall back to the column defaults via Prefer: missing=default
+    # Checked per row, since one bad timestamp would otherwise fail its whole chunk
+    for field in ("created_at", "completed_at"):
+        if row.get(field):
+            try:
+                record[field] = datetime.fromisoformat(str(row[field])).isoformat()
+            except ValueError:
+                raise ValueError(f"{field} must be an ISO 8601 timestamp")
+    # Completed tasks need a completion time for archiving and analytics
+    if record["completed"]:
+        record.setdefault("completed_at", datetime.now(timezone.utc).isoformat())
+    else:
+        record.pop("completed_at", None)
+    return record
+
+
+def upstream_error(response) -> str:
+    """PostgREST's message for a failed request, falling back to the status code."""
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and body.get("message"):
+        return body["message"]
+    return f"HTTP {response.status_code}"
+
+
+@app.post("/admin/tasks/import")
+async def import_tasks(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    import_id: Optional[str] = Header(None),
+    current_user: TokenData = Depends(require_admin),
+    authorization: str = Header(None)
+):
+    import_id = import_id or uuid.uuid4().hex
+    logger.info(f"POST /admin/tasks/import - admin={current_user.email}, format={format}, import={import_id}")
+    token = authorization.replace("Bearer ", "")
+    
+    job = {"id": import_id, "status": "running", "rows": 0, "inserted": 0, "failed": 0, "errors": []}
+    import_jobs.set(import_id, job)
+    
+    def record_error(row_number: int, error: str):
+        job["failed"] += 1
+        if len(job["errors"]) < IMPORT_MAX_ERRORS:
+            job["errors"].append({"row": row_number, "error": error})
+    
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+    pending = set()
+    
+    async def insert_rows(client: "httpx.AsyncClient", shard: dict, chunk: list):
+        try:
+            with span("insert"):
+                response = await client.post(
+                    f"{shard['url']}/rest/v1/tasks?columns=title,completed,user_id,created_at,completed_at",
+                    headers={
+                        **shard_headers(shard, token),
+                        "Prefer": "return=minimal, missing=default"
+                    },
+                    json=[record for _, record in chunk]
+                )
+        except httpx.HTTPError as e:
+            for row_number, _ in chunk:
+                record_error(row_number, f"Failed to insert chunk: {type(e).__name__}")
+            return
         
-        if response.status_code not in [200, 204]:
-            raise HTTPException(status_code=400, detail={"error": "Failed to delete user"})
+        if response.status_code in [200, 201, 204]:
+            job["inserted"] += len(chunk)
+        elif response.status_code in [400, 409] and len(chunk) > 1:
+            # One rejected row fails the whole statement; halve the chunk until only the bad rows are left
+            middle = len(chunk) // 2
+            await insert_rows(client, shard, chunk[:middle])
+            await insert_rows(client, shard, chunk[middle:])
+        else:
+            error = upstream_error(response)
+            for row_number, _ in chunk:
+                record_error(row_number, f"Failed to insert {'row' if len(chunk) == 1 else 'chunk'}: {error}")
+    
+    async def insert_chunk(client: "httpx.AsyncClient", shard: dict, chunk: list):
+        try:
+            await insert_rows(client, shard, chunk)
+        finally:
+            semaphore.release()
+    
+    async with httpx.AsyncClient() as client:
         
-        return None
+        async def flush(shard: dict, chunk: list):
+            # Waiting for a free slot also stops reading the upload, bounding memory
+            await semaphore.acquire()
+            insert = asyncio.create_task(insert_chunk(client, shard, chunk))
+            pending.add(insert)
+            insert.add_done_callback(pending.discard)
+        
+        # One open chunk per shard, keyed by shard name
+        chunks = {}
+        try:
+            async for row_number, row, error in iter_import_rows(request.stream(), format):
+                job["rows"] += 1
+                if error is None:
+                    try:
+                        record = parse_import_row(row)
+                    except ValueError as e:
+                        error = str(e)
+                if error is not None:
+                    record_error(row_number, error)
+                    continue
+                
+                shard = shard_ring.shard_for(record["user_id"])
+                chunk = chunks.setdefault(shard["name"], [])
+                chunk.append((row_number, record))
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    await flush(shard, chunks.pop(shard["name"]))
+                    logger.info(f"Import {import_id} - rows={job['rows']}, inserted={job['inserted']}, failed={job['failed']}")
+            
+            for name, chunk in chunks.items():
+                await flush(shard_ring.by_name[name], chunk)
+        except BaseException as e:
+            job["status"] = "failed"
+            job["error"] = str(e) or type(e).__name__
+            logger.error(f"Import {import_id} failed after {job['rows']} rows - {job['error']}")
+            if isinstance(e, ValueError):
+                raise HTTPException(status_code=400, detail={"error": job["error"]})
+            raise
+        finally:
+            # Chunks already sent are still counted, whether or not the upload completed
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            task_list_cache.invalidate()
+    
+    job["status"] = "done"
+    logger.info(f"Import {import_id} done - rows={job['rows']}, inserted={job['inserted']}, failed={job['failed']}")
+    return job
+
+
+@app.get("/admin/tasks/import/{import_id}")
+async def get_import(import_id: str, current_user: TokenData = Depends(require_admin)):
+    job = import_jobs.get(import_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"error": "Import not found"})
+    return job
+
+
+async def fetch_completion_counts(client: "httpx.AsyncClient", shard: dict, bucket: str, start: str, end: str) -> list:
+    """One shard's (user_id, period, created, completed) rows, grouped in the database."""
+    with span("counts"):
+        response = await client.post(
+            f"{shard['url']}/rest/v1/rpc/task_completion_counts",
+            headers=shard_service_headers(shard),
+            json={"bucket": bucket, "range_start": start, "range_end": end}
+        )
+    
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail={"error": "Failed to fetch completion counts"})
+    return response.json()
+
+
+def summarize_counts(created: Counter, completed: Counter) -> tuple:
+    totals = {}
+    users = {}
+    for (user_id, period) in created.keys() | completed.keys():
+        entry = {"created": created[(user_id, period)], "completed": completed[(user_id, period)]}
+        users.setdefault(user_id, {})[period] = entry
+        total = totals.setdefault(period, {"created": 0, "completed": 0})
+        total["created"] += entry["created"]
+        total["completed"] += entry["completed"]
+    
+    def periods(entries: dict) -> list:
+        return [{"period": period, **entries[period]} for period in sorted(entries)]
+    
+    return periods(totals), [
+        {"user_id": user_id, "periods": periods(users[user_id])}
+        for user_id in sorted(users, key=str)
+    ]
+
+
+async def load_completion_analytics(bucket: str, start: str, end: str) -> dict:
+    # Each shard returns one row per user and period, so only those partial counts cross the network
+    async with httpx.AsyncClient() as client:
+        shard_rows = await asyncio.gather(*(
+            fetch_completion_counts(client, shard, bucket, start, end)
+            for shard in shard_ring.shards
+        ))
+    
+    with span("aggregate", SPAN_KIND_INTERNAL):
+        created, completed = Counter(), Counter()
+        for rows in shard_rows:
+            for row in rows:
+                created[(row["user_id"], row["period"])] += row["created"]
+                completed[(row["user_id"], row["period"])] += row["completed"]
+        totals, users = summarize_counts(created, completed)
+    analytics = {"bucket": bucket, "start": start, "end": end, "totals": totals, "users": users}
+    analytics_cache.set((bucket, start, end), analytics)
+    return analytics
+
+
+@app.get("/admin/analytics/completion")
+async def get_completion_analytics(
+    bucket: str = Query("day", pattern="^(day|week)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: TokenData = Depends(require_admin)
+):
+    end = end or datetime.now(timezone.utc).date() + timedelta(days=1)
+    start = start or end - timedelta(days=90)
+    if bucket == "week":
+        # Whole weeks only, so every bucket covers the same span
+        start -= timedelta(days=start.weekday())
+        end += timedelta(days=-end.weekday() % 7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail={"error": "start must be before end"})
+    
+    logger.info(f"GET /admin/analytics/completion - admin={current_user.email}, bucket={bucket}, start={start}, end={end}")
+    
+    key = (bucket, start.isoformat(), end.isoformat())
+    analytics = analytics_cache.get(key)
+    if analytics is None:
+        analytics = await singleflight(analytics_inflight, key, lambda: load_completion_analytics(*key))
+    return analytics
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = "text",
+    current_user: TokenData = Depends(require_admin)
+):
+    logger.info(f"GET /admin/profiles/{profile_id} - admin={current_user.email}")
+    
+    if not re.fullmatch(r"[0-9a-f]{32}", profile_id) or not os.path.exists(profile_path(profile_id)):
+        raise HTTPException(status_code=404, detail={"error": "Profile not found"})
+    
+    if format == "raw":
+        return FileResponse(profile_path(profile_id), media_type="application/octet-stream")
+    
+    import pstats
+    output = io.StringIO()
+    stats = pstats.Stats(profile_path(profile_id), stream=output)
+    stats.sort_stats("cumulative").print_stats(50)
+    return PlainTextResponse(output.getvalue())
+
+
+@app.get("/admin/admission")
+async def get_admission_metrics(current_user: TokenData = Depends(require_admin)):
+    return admission.metrics()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=3000)
+    if WORKERS > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=3000, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=3000)
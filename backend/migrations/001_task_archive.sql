@@ -0,0 +1,24 @@
+-- Completion timestamp used to pick tasks for archiving
+alter table public.tasks add column if not exists completed_at timestamptz;
+-- Existing completed tasks start their archive countdown at migration time
+update public.tasks set completed_at = now() where completed and completed_at is null;
+
+create index if not exists tasks_completed_at_idx
+    on public.tasks (completed_at)
+    where completed;
+
+-- Cold storage for tasks completed more than ARCHIVE_AFTER_DAYS ago
+create table if not exists public.tasks_archive (
+    like public.tasks including defaults,
+    archived_at timestamptz not null default now(),
+    primary key (id)
+);
+
+create index if not exists tasks_archive_user_completed_idx
+    on public.tasks_archive (user_id, completed_at desc);
+
+alter table public.tasks_archive enable row level security;
+
+create policy "Users read own archived tasks"
+    on public.tasks_archive for select
+    using (auth.uid() = user_id);
@@ -0,0 +1,7 @@
+-- Lets PostgREST embed tasks(count) in the admin user directory query
+alter table public.tasks
+    add constraint tasks_user_id_profiles_fkey
+    foreign key (user_id) references public.profiles (id) on delete cascade
+    not valid;
+
+create index if not exists tasks_user_id_idx on public.tasks (user_id);
@@ -0,0 +1,6 @@
+-- created_at range scans for the admin completion analytics endpoint (completed_at on tasks: see 007)
+create index if not exists tasks_created_at_idx on public.tasks (created_at);
+
+create index if not exists tasks_archive_created_at_idx on public.tasks_archive (created_at);
+
+create index if not exists tasks_archive_completed_at_idx on public.tasks_archive (completed_at);
@@ -0,0 +1,55 @@
+-- Manual ordering: position holds base-62 fractional keys compared byte-wise
+alter table public.tasks add column if not exists position text collate "C";
+alter table public.tasks_archive add column if not exists position text collate "C";
+
+-- Existing tasks keep their newest-first order; keys are fixed-width hex with a non-zero tail
+update public.tasks t
+set position = 'V' || lpad(to_hex(ranked.n), 8, '0') || 'V'
+from (
+    select id, row_number() over (partition by user_id order by created_at desc) as n
+    from public.tasks
+) ranked
+where t.id = ranked.id and t.position is null;
+
+-- Key sorting just above k; mirrors rank_between(None, k) in main.py
+create or replace function public.task_rank_before(k text) returns text
+language plpgsql immutable as $$
+declare
+    digits constant text := '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz';
+    d int;
+begin
+    if k is null or k = '' then
+        return 'V';
+    end if;
+    d := strpos(digits, left(k, 1)) - 1;
+    if d > 1 then
+        return substr(digits, d, 1);
+    elsif d = 1 then
+        return '0z';
+    end if;
+    return '0' || public.task_rank_before(substr(k, 2));
+end;
+$$;
+
+-- New tasks go to the top of the list without an extra round trip from the API
+create or replace function public.tasks_default_position() returns trigger
+language plpgsql as $$
+begin
+    if new.position is null then
+        new.position := public.task_rank_before(
+            (select min(position) from public.tasks where user_id = new.user_id)
+        );
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists tasks_default_position on public.tasks;
+create trigger tasks_default_position
+    before insert on public.tasks
+    for each row execute function public.tasks_default_position();
+
+alter table public.tasks alter column position set not null;
+
+create index if not exists tasks_user_position_idx
+    on public.tasks (user_id, position, created_at desc);
@@ -0,0 +1,42 @@
+-- Tags filtered with PostgREST ov (any) / cs (all), both answered by the GIN index
+alter table public.tasks add column if not exists tags text[] not null default '{}';
+alter table public.tasks_archive add column if not exists tags text[] not null default '{}';
+
+create index if not exists tasks_tags_idx on public.tasks using gin (tags);
+
+-- Per-user tag counts for GET /tasks/tags, kept current by a trigger instead of scanning tasks
+create table if not exists public.task_tag_counts (
+    user_id uuid not null,
+    tag text not null,
+    task_count integer not null default 0,
+    primary key (user_id, tag)
+);
+
+alter table public.task_tag_counts enable row level security;
+
+create policy "Users read own tag counts"
+    on public.task_tag_counts for select
+    using (auth.uid() = user_id);
+
+create or replace function public.tasks_count_tags() returns trigger
+language plpgsql security definer set search_path = public as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        update task_tag_counts c
+        set task_count = c.task_count - 1
+        from unnest(old.tags) as t(tag)
+        where c.user_id = old.user_id and c.tag = t.tag;
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        insert into task_tag_counts (user_id, tag, task_count)
+        select new.user_id, t.tag, 1 from unnest(new.tags) as t(tag)
+        on conflict (user_id, tag) do update set task_count = task_tag_counts.task_count + 1;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists tasks_count_tags on public.tasks;
+create trigger tasks_count_tags
+    after insert or delete or update of tags, user_id on public.tasks
+    for each row execute function public.tasks_count_tags();
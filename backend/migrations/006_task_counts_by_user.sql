@@ -0,0 +1,9 @@
+-- Per-user task counts for the sharded admin directory; PostgREST aggregates are disabled by default
+create or replace function public.task_counts_by_user()
+returns table (user_id uuid, task_count bigint)
+language sql stable as $$
+    select user_id, count(*) from public.tasks group by user_id;
+$$;
+
+-- Counts cover every user, so only the service role may call it
+revoke execute on function public.task_counts_by_user() from public, anon, authenticated;
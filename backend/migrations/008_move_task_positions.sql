@@ -0,0 +1,14 @@
+-- Bulk position rewrite for rebalance_positions in main.py; a move applies only while the
+-- row still has its old key, so a move made by the user meanwhile is not overwritten
+create or replace function public.move_task_positions(moves jsonb)
+returns table (id uuid)
+language sql as $$
+    update public.tasks t
+    set position = m.new_position
+    from jsonb_to_recordset(moves) as m(id uuid, old_position text, new_position text)
+    where t.id = m.id and t.position = m.old_position
+    returning t.id;
+$$;
+
+-- Rewrites any user's keys, so only the service role may call it
+revoke execute on function public.move_task_positions(jsonb) from public, anon, authenticated;
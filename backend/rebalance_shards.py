@@ -0,0 +1,27 @@
+"""Moves tasks and archived tasks to the shard their owner hashes to under the current TASK_SHARDS.
+
+Run once after adding or removing a shard:
+
+    python rebalance_shards.py --dry-run
+    python rebalance_shards.py
+"""
+import argparse
+import asyncio
+
+import main
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true", help="only report what would move")
+    args = parser.parse_args()
+
+    moved = asyncio.run(main.rebalance_shards(dry_run=args.dry_run))
+    if not moved:
+        print("All tasks are on their owner's shard")
+    for route, count in sorted(moved.items()):
+        print(f"{route}: {count} rows {'to move' if args.dry_run else 'moved'}")
+
+
+if __name__ == "__main__":
+    run()
@@ -2,18 +2,25 @@ import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
+import httpx
 import jwt
 from datetime import datetime, timezone, timedelta
+import asyncio
+import json
 import os
+import time
+import uuid
 
 os.environ["SUPABASE_URL"] = "https://test.supabase.co"
 os.environ["SUPABASE_KEY"] = "test-key"
 os.environ["SUPABASE_JWT_SECRET"] = "test-secret-key-for-jwt-testing-purposes"
 os.environ["SUPABASE_SERVICE_ROLE_KEY"] = "test-service-role-key"
 
+import main
 from main import app, get_current_user, require_admin, TokenData
 
 client = TestClient(app)
+RealAsyncClient = httpx.AsyncClient
 
 
 def create_test_token(user_id: str, email: str, role: str = "user", expired: bool = False):
@@ -34,6 +41,13 @@ ADMIN_TOKEN = create_test_token("admin-456", "admin@example.com", "admin")
 EXPIRED_TOKEN = create_test_token("user-123", "user@example.com", "user", expired=True)
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in main.caches.values():
+        cache.clear()
+    yield
+
+
 class TestAuthRegister:
 
     @patch('main.httpx.AsyncClient')
@@ -181,6 +195,80 @@ class TestAuthLogin:
         assert response.status_code == 422
 
 
+def mock_refresh_client(mock_client, status_code=200, delay=0):
+    mock_response = MagicMock()
+    mock_response.status_code = status_code
+    mock_response.json.return_value = {
+        "access_token": ADMIN_TOKEN,
+        "refresh_token": "rotated-refresh-token",
+        "expires_in": 3600,
+        "user": {"id": "admin-456", "email": "admin@example.com"}
+    }
+    
+    async def post(*args, **kwargs):
+        await asyncio.sleep(delay)
+        return mock_response
+    
+    mock_client_instance = AsyncMock()
+    mock_client_instance.post = AsyncMock(side_effect=post)
+    mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+    mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+    mock_client.return_value = mock_client_instance
+    return mock_client_instance
+
+
+class TestAuthRefresh:
+
+    @patch('main.httpx.AsyncClient')
+    def test_refresh_success(self, mock_client):
+        mock_refresh_client(mock_client)
+        
+        response = client.post("/auth/refresh", json={"refresh_token": "refresh-token"})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["token"] == ADMIN_TOKEN
+        assert data["refresh_token"] == "rotated-refresh-token"
+        assert data["user"]["role"] == "admin"
+
+    @patch('main.httpx.AsyncClient')
+    def test_refresh_invalid_token(self, mock_client):
+        mock_refresh_client(mock_client, status_code=400)
+        
+        response = client.post("/auth/refresh", json={"refresh_token": "revoked"})
+        
+        assert response.status_code == 401
+        assert response.json()["detail"]["error"] == "Invalid refresh token"
+
+    def test_refresh_missing_token(self):
+        response = client.post("/auth/refresh", json={})
+        
+        assert response.status_code == 422
+
+    @patch('main.httpx.AsyncClient')
+    def test_repeated_refresh_served_from_cache(self, mock_client):
+        mock_client_instance = mock_refresh_client(mock_client)
+        
+        for _ in range(3):
+            response = client.post("/auth/refresh", json={"refresh_token": "refresh-token"})
+            assert response.status_code == 200
+        
+        assert mock_client_instance.post.call_count == 1
+
+    @patch('main.httpx.AsyncClient')
+    def test_concurrent_refreshes_collapse(self, mock_client):
+        mock_client_instance = mock_refresh_client(mock_client, delay=0.05)
+        
+        async def scenario():
+            body = main.TokenRefresh(refresh_token="refresh-token")
+            return await asyncio.gather(*(main.refresh(body) for _ in range(5)))
+        
+        sessions = asyncio.run(scenario())
+        
+        assert mock_client_instance.post.call_count == 1
+        assert all(session["token"] == ADMIN_TOKEN for session in sessions)
+
+
 class TestTasksAuthorization:
 
     def test_get_tasks_no_token(self):
@@ -299,6 +387,81 @@ class TestCreateTask:
         assert response.status_code == 422
 
 
+def mock_insert_client(mock_client, delay=0):
+    mock_response = MagicMock()
+    mock_response.status_code = 201
+    mock_response.json.return_value = [{
+        "id": "task-new",
+        "title": "Retry me",
+        "completed": False,
+        "user_id": "user-123"
+    }]
+    
+    async def post(*args, **kwargs):
+        await asyncio.sleep(delay)
+        return mock_response
+    
+    mock_client_instance = AsyncMock()
+    mock_client_instance.post = AsyncMock(side_effect=post)
+    mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+    mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+    mock_client.return_value = mock_client_instance
+    return mock_client_instance
+
+
+class TestIdempotentCreateTask:
+
+    @patch('main.httpx.AsyncClient')
+    def test_retry_replays_stored_response(self, mock_client):
+        mock_client_instance = mock_insert_client(mock_client)
+        headers = {"Authorization": f"Bearer {USER_TOKEN}", "Idempotency-Key": "retry-1"}
+        
+        first = client.post("/tasks", json={"title": "Retry me"}, headers=headers)
+        second = client.post("/tasks", json={"title": "Retry me"}, headers=headers)
+        
+        assert first.status_code == 201
+        assert second.status_code == 201
+        assert second.json() == first.json()
+        assert "Idempotent-Replayed" not in first.headers
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert mock_client_instance.post.call_count == 1
+
+    @patch('main.httpx.AsyncClient')
+    def test_keys_are_scoped_to_user(self, mock_client):
+        mock_client_instance = mock_insert_client(mock_client)
+        
+        client.post("/tasks", json={"title": "Retry me"}, headers={"Authorization": f"Bearer {USER_TOKEN}", "Idempotency-Key": "shared"})
+        client.post("/tasks", json={"title": "Retry me"}, headers={"Authorization": f"Bearer {ADMIN_TOKEN}", "Idempotency-Key": "shared"})
+        
+        assert mock_client_instance.post.call_count == 2
+
+    @patch('main.httpx.AsyncClient')
+    def test_key_reused_with_different_body(self, mock_client):
+        mock_insert_client(mock_client)
+        headers = {"Authorization": f"Bearer {USER_TOKEN}", "Idempotency-Key": "retry-2"}
+        
+        client.post("/tasks", json={"title": "Retry me"}, headers=headers)
+        response = client.post("/tasks", json={"title": "Something else"}, headers=headers)
+        
+        assert response.status_code == 422
+
+    @patch('main.httpx.AsyncClient')
+    def test_concurrent_duplicates_wait_for_first(self, mock_client):
+        mock_client_instance = mock_insert_client(mock_client, delay=0.05)
+        user = TokenData(user_id="user-123", email="user@example.com", role="user")
+        
+        async def scenario():
+            return await asyncio.gather(*(
+                main.create_task(main.TaskCreate(title="Retry me"), main.Response(), user, f"Bearer {USER_TOKEN}", "retry-3")
+                for _ in range(5)
+            ))
+        
+        created = asyncio.run(scenario())
+        
+        assert mock_client_instance.post.call_count == 1
+        assert all(task["id"] == "task-new" for task in created)
+
+
 class TestUpdateTask:
 
     def test_update_task_no_token(self):
@@ -429,6 +592,149 @@ class TestUpdateTask:
         
         assert response.status_code == 200
         assert response.json()["completed"] == True
+        assert "completed_at" in mock_client_instance.patch.call_args.kwargs["json"]
+
+    @patch('main.httpx.AsyncClient')
+    def test_update_completed_task_keeps_completion_time(self, mock_client):
+        task = {"id": "task-123", "title": "My task", "completed": True, "user_id": "user-123"}
+        mock_get_response = MagicMock()
+        mock_get_response.status_code = 200
+        mock_get_response.json.return_value = [task]
+        
+        mock_patch_response = MagicMock()
+        mock_patch_response.status_code = 200
+        mock_patch_response.json.return_value = [{**task, "title": "Renamed"}]
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(return_value=mock_get_response)
+        mock_client_instance.patch = AsyncMock(return_value=mock_patch_response)
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        
+        response = client.patch(
+            "/tasks/task-123",
+            json={"completed": True, "title": "Renamed"},
+            headers={"Authorization": f"Bearer {USER_TOKEN}"}
+        )
+        
+        assert response.status_code == 200
+        assert mock_client_instance.patch.call_args.kwargs["json"] == {"completed": True, "title": "Renamed"}
+
+
+class TestArchive:
+
+    @patch('main.ARCHIVE_BATCH_SIZE', 2)
+    @patch('main.httpx.AsyncClient')
+    def test_archiver_moves_batches(self, mock_client):
+        old_tasks = [
+            {"id": f"task-{i}", "title": "Old", "completed": True, "user_id": "user-123", "completed_at": "2020-01-01T00:00:00Z"}
+            for i in range(3)
+        ]
+        pages = []
+        for page in (old_tasks[:2], old_tasks[2:]):
+            mock_response = MagicMock()
+            mock_response.status_code = 200
+            mock_response.json.return_value = page
+            pages.append(mock_response)
+        
+        mock_ok = MagicMock()
+        mock_ok.status_code = 201
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(side_effect=pages)
+        mock_client_instance.post = AsyncMock(return_value=mock_ok)
+        mock_client_instance.delete = AsyncMock(return_value=MagicMock(status_code=204))
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        main.task_list_cache.set("user-123", old_tasks)
+        
+        archived = asyncio.run(main.archive_completed_tasks())
+        
+        assert archived == 3
+        assert mock_client_instance.post.call_args_list[0].kwargs["json"] == old_tasks[:2]
+        deleted = [call.args[0] for call in mock_client_instance.delete.call_args_list]
+        assert deleted[0].endswith("tasks?id=in.(task-0,task-1)")
+        assert deleted[1].endswith("tasks?id=in.(task-2)")
+        assert main.task_list_cache.get("user-123") is None
+
+    @patch('main.httpx.AsyncClient')
+    def test_archiver_stops_when_copy_fails(self, mock_client):
+        mock_get_response = MagicMock()
+        mock_get_response.status_code = 200
+        mock_get_response.json.return_value = [{"id": "task-1", "user_id": "user-123"}]
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(return_value=mock_get_response)
+        mock_client_instance.post = AsyncMock(return_value=MagicMock(status_code=500))
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        
+        with pytest.raises(RuntimeError):
+            asyncio.run(main.archive_completed_tasks())
+        
+        mock_client_instance.delete.assert_not_called()
+
+    @patch('main.httpx.AsyncClient')
+    def test_get_archived_tasks_paged(self, mock_client):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = [{"id": "task-1", "title": "Old", "completed": True}]
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        
+        response = client.get("/tasks/archive?page=3&limit=20", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+        
+        assert response.status_code == 200
+        assert response.json()[0]["id"] == "task-1"
+        assert "limit=20&offset=40" in mock_client_instance.get.call_args.args[0]
+
+    def test_get_archived_tasks_invalid_page(self):
+        response = client.get("/tasks/archive?page=0", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+        
+        assert response.status_code == 422
+
+
+class TestArchiverLock:
+
+    def run_loop(self, tmp_path):
+        async def scenario():
+            loop = asyncio.create_task(main.archive_loop())
+            await asyncio.sleep(0.05)
+            loop.cancel()
+            await asyncio.gather(loop, return_exceptions=True)
+        
+        with patch('main.INVALIDATION_SOCKET_DIR', str(tmp_path)), patch('main.ARCHIVE_INTERVAL', 0.01), \
+                patch('main.archive_completed_tasks', AsyncMock(return_value=0)) as archive:
+            asyncio.run(scenario())
+        return archive
+
+    def test_lock_is_exclusive(self, tmp_path):
+        path = str(tmp_path / "archiver.lock")
+        first = main.try_lock(path)
+        
+        assert first is not None
+        assert main.try_lock(path) is None
+        os.close(first)
+        second = main.try_lock(path)
+        assert second is not None
+        os.close(second)
+
+    def test_only_lock_holder_archives(self, tmp_path):
+        held = main.try_lock(str(tmp_path / "archiver.lock"))
+        try:
+            archive = self.run_loop(tmp_path)
+        finally:
+            os.close(held)
+        
+        assert archive.await_count == 0
+        assert self.run_loop(tmp_path).await_count > 0
 
 
 class TestDeleteTask:
@@ -655,6 +961,1480 @@ class TestAdminEndpoints:
         assert response.status_code == 204
 
 
+DIRECTORY_PROFILES = [
+    {"id": "user-1", "email": "carol@example.com", "role": "user", "tasks": [{"count": 3}]},
+    {"id": "user-2", "email": "Alice@example.com", "role": "user", "tasks": [{"count": 0}]},
+    {"id": "user-3", "email": "alex@example.com", "role": "admin", "tasks": [{"count": 7}]}
+]
+
+
+def mock_directory_client(mock_client):
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.side_effect = lambda: [dict(profile) for profile in DIRECTORY_PROFILES]
+    
+    mock_client_instance = AsyncMock()
+    mock_client_instance.get = AsyncMock(return_value=mock_response)
+    mock_client_instance.delete = AsyncMock(return_value=MagicMock(status_code=204))
+    mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+    mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+    mock_client.return_value = mock_client_instance
+    return mock_client_instance
+
+
+class TestUserDirectory:
+
+    @patch('main.httpx.AsyncClient')
+    def test_directory_sorted_with_task_counts(self, mock_client):
+        mock_directory_client(mock_client)
+        
+        response = client.get("/admin/users", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+        
+        users = response.json()
+        assert response.headers["X-Total-Count"] == "3"
+        assert [user["email"] for user in users] == ["alex@example.com", "Alice@example.com", "carol@example.com"]
+        assert [user["task_count"] for user in users] == [7, 0, 3]
+
+    @patch('main.httpx.AsyncClient')
+    def test_directory_email_prefix_search_and_paging(self, mock_client):
+        mock_directory_client(mock_client)
+        headers = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        
+        first = client.get("/admin/users?search=AL&limit=1", headers=headers)
+        second = client.get("/admin/users?search=al&limit=1&page=2", headers=headers)
+        
+        assert first.headers["X-Total-Count"] == "2"
+        assert [user["id"] for user in first.json()] == ["user-3"]
+        assert [user["id"] for user in second.json()] == ["user-2"]
+
+    @patch('main.httpx.AsyncClient')
+    def test_directory_served_from_cache(self, mock_client):
+        mock_client_instance = mock_directory_client(mock_client)
+        
+        for _ in range(3):
+            client.get("/admin/users", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+        
+        assert mock_client_instance.get.call_count == 1
+
+    @patch('main.httpx.AsyncClient')
+    def test_stale_directory_refreshed_in_background(self, mock_client):
+        mock_client_instance = mock_directory_client(mock_client)
+        
+        async def scenario():
+            await main.get_user_directory()
+            main.user_directory_cache.get("directory")["loaded_at"] -= main.USER_DIRECTORY_TTL + 1
+            stale = await main.get_user_directory()
+            await asyncio.sleep(0)
+            return stale
+        
+        stale = asyncio.run(scenario())
+        
+        assert len(stale["users"]) == 3
+        assert mock_client_instance.get.call_count == 2
+
+    @patch('main.httpx.AsyncClient')
+    def test_delete_user_uses_and_invalidates_directory(self, mock_client):
+        mock_client_instance = mock_directory_client(mock_client)
+        headers = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        client.get("/admin/users", headers=headers)
+        
+        response = client.delete("/admin/users/user-1", headers=headers)
+        
+        assert response.status_code == 204
+        assert mock_client_instance.get.call_count == 1
+        assert main.user_directory_cache.get("directory") is None
+
+    @patch('main.httpx.AsyncClient')
+    def test_delete_user_removes_archived_tasks(self, mock_client):
+        mock_client_instance = mock_directory_client(mock_client)
+        
+        response = client.delete("/admin/users/user-1", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+        
+        urls = [call.args[0] for call in mock_client_instance.delete.call_args_list]
+        assert response.status_code == 204
+        assert f"{main.SUPABASE_URL}/rest/v1/tasks_archive?user_id=eq.user-1" in urls
+        assert not any("/rest/v1/tasks?" in url for url in urls)
+
+
+    @patch('main.httpx.AsyncClient')
+    def test_delete_user_rechecks_with_stale_directory(self, mock_client):
+        mock_client_instance = mock_directory_client(mock_client)
+        headers = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        client.get("/admin/users", headers=headers)
+        main.user_directory_cache.get("directory")["loaded_at"] -= main.USER_DIRECTORY_TTL + 1
+        missing = MagicMock(status_code=200)
+        missing.json.return_value = []
+        mock_client_instance.get = AsyncMock(return_value=missing)
+        
+        response = client.delete("/admin/users/user-1", headers=headers)
+        
+        assert response.status_code == 404
+        assert mock_client_instance.delete.call_count == 0
+
+    def test_paging_headers_exposed_to_browsers(self):
+        response = client.get(
+            "/health/live",
+            headers={"Origin": "http://localhost:5173"}
+        )
+        
+        exposed = {header.strip().lower() for header in response.headers["Access-Control-Expose-Headers"].split(",")}
+        assert {"x-total-count", "x-profile-id", "idempotent-replayed"} <= exposed
+
+
+class TestTaskListCache:
+
+    @patch('main.httpx.AsyncClient')
+    def test_get_tasks_served_from_cache(self, mock_client):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = [{"id": "task-1", "title": "Cached", "user_id": "user-123"}]
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        
+        for _ in range(3):
+            response = client.get("/tasks", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+            assert response.status_code == 200
+            assert response.json()[0]["title"] == "Cached"
+        
+        assert mock_client_instance.get.call_count == 1
+
+    @patch('main.httpx.AsyncClient')
+    def test_create_task_invalidates_cache(self, mock_client):
+        mock_get_response = MagicMock()
+        mock_get_response.status_code = 200
+        mock_get_response.json.return_value = []
+        
+        mock_post_response = MagicMock()
+        mock_post_response.status_code = 201
+        mock_post_response.json.return_value = [{"id": "task-1", "title": "New", "user_id": "user-123"}]
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(return_value=mock_get_response)
+        mock_client_instance.post = AsyncMock(return_value=mock_post_response)
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        client.get("/tasks", headers=headers)
+        client.post("/tasks", json={"title": "New"}, headers=headers)
+        client.get("/tasks", headers=headers)
+        
+        assert mock_client_instance.get.call_count == 2
+
+    @patch('main.httpx.AsyncClient')
+    def test_read_overlapping_write_is_not_cached(self, mock_client):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = [{"id": "task-1", "title": "old", "user_id": "user-123"}]
+        
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return mock_response
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(side_effect=slow_get)
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        user = TokenData(user_id="user-123", email="user@example.com", role="user")
+        
+        async def scenario():
+            read = asyncio.create_task(main.get_tasks(
+                sort="created_at", tag=[], match="any", current_user=user, authorization=f"Bearer {USER_TOKEN}"
+            ))
+            await asyncio.sleep(0.01)
+            # What update_task does once its PATCH lands
+            main.task_list_cache.invalidate("user-123")
+            return await read
+        
+        tasks = asyncio.run(scenario())
+        
+        assert tasks[0]["title"] == "old"
+        assert main.task_list_cache.get("user-123") is None
+
+    def test_invalidation_bus_reaches_other_worker(self, tmp_path):
+        async def scenario():
+            sender = main.InvalidationBus(str(tmp_path), "worker-a")
+            receiver = main.InvalidationBus(str(tmp_path), "worker-b")
+            await sender.start()
+            await receiver.start()
+            try:
+                main.task_list_cache.set("user-123", [{"id": "task-1"}])
+                sender.publish("task_lists", "user-123")
+                await asyncio.sleep(0.05)
+            finally:
+                sender.stop()
+                receiver.stop()
+        
+        asyncio.run(scenario())
+        
+        assert main.task_list_cache.get("user-123") is None
+
+
+def mock_paged_client(mock_client, pages):
+    responses = []
+    for page in pages:
+        mock_response = MagicMock()
+        mock_response.status_code = 206
+        mock_response.json.return_value = page
+        responses.append(mock_response)
+    
+    mock_client_instance = AsyncMock()
+    mock_client_instance.get = AsyncMock(side_effect=responses)
+    mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+    mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+    mock_client.return_value = mock_client_instance
+    return mock_client_instance
+
+
+EXPORT_ROWS = [
+    {"id": f"task-{i}", "user_id": "user-123", "title": f"Task {i}", "completed": i % 2 == 0, "created_at": f"2025-01-1{i}T10:00:00Z"}
+    for i in range(3)
+]
+
+
+class TestTaskExport:
+
+    @patch('main.EXPORT_PAGE_SIZE', 2)
+    @patch('main.httpx.AsyncClient')
+    def test_export_ndjson_pages_through_upstream(self, mock_client):
+        mock_client_instance = mock_paged_client(mock_client, [EXPORT_ROWS[:2], EXPORT_ROWS[2:]])
+        
+        response = client.get("/admin/tasks/export", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(line) for line in response.text.splitlines()] == EXPORT_ROWS
+        ranges = [call.kwargs["headers"]["Range"] for call in mock_client_instance.get.call_args_list]
+        assert ranges == ["0-1", "2-3"]
+
+    @patch('main.EXPORT_PAGE_SIZE', 2)
+    @patch('main.httpx.AsyncClient')
+    def test_export_csv(self, mock_client):
+        mock_paged_client(mock_client, [EXPORT_ROWS[:2], EXPORT_ROWS[2:]])
+        
+        response = client.get("/admin/tasks/export?format=csv", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+        
+        lines = response.text.splitlines()
+        assert response.status_code == 200
+        assert lines[0] == "id,user_id,title,completed,created_at"
+        assert lines[1] == "task-0,user-123,Task 0,True,2025-01-10T10:00:00Z"
+        assert len(lines) == 4
+
+    @patch('main.EXPORT_PAGE_SIZE', 2)
+    @patch('main.httpx.AsyncClient')
+    def test_export_aborts_when_later_page_fails(self, mock_client):
+        mock_client_instance = mock_paged_client(mock_client, [EXPORT_ROWS[:2]])
+        first_page = mock_client_instance.get.side_effect.__next__()
+        mock_client_instance.get.side_effect = [first_page, MagicMock(status_code=503)]
+        
+        with pytest.raises(RuntimeError, match="Export aborted at offset 2"):
+            client.get("/admin/tasks/export", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+        
+        assert mock_client_instance.aclose.await_count == 1
+
+    @patch('main.httpx.AsyncClient')
+    def test_export_filters_pushed_down(self, mock_client):
+        mock_client_instance = mock_paged_client(mock_client, [[]])
+        
+        client.get(
+            "/admin/tasks/export?user_id=user-123&created_from=2025-01-01T00:00:00Z",
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        )
+        
+        params = mock_client_instance.get.call_args.kwargs["params"]
+        assert ("user_id", "eq.user-123") in params
+        assert ("created_at", "gte.2025-01-01T00:00:00+00:00") in params
+
+    def test_export_invalid_format(self):
+        response = client.get("/admin/tasks/export?format=xml", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+        
+        assert response.status_code == 422
+
+    def test_export_user_role_forbidden(self):
+        response = client.get("/admin/tasks/export", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+        
+        assert response.status_code == 403
+
+
+def mock_import_client(mock_client, status_code=201):
+    mock_response = MagicMock()
+    mock_response.status_code = status_code
+    
+    mock_client_instance = AsyncMock()
+    mock_client_instance.post = AsyncMock(return_value=mock_response)
+    mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+    mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+    mock_client.return_value = mock_client_instance
+    return mock_client_instance
+
+
+class TestTaskImport:
+
+    @patch('main.IMPORT_CHUNK_SIZE', 2)
+    @patch('main.httpx.AsyncClient')
+    def test_import_ndjson_in_chunks(self, mock_client):
+        mock_client_instance = mock_import_client(mock_client)
+        body = "\n".join(json.dumps({"title": f"Task {i}", "user_id": "user-123"}) for i in range(5))
+        
+        response = client.post(
+            "/admin/tasks/import",
+            content=body,
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["inserted"] == 5
+        assert response.json()["failed"] == 0
+        chunks = [call.kwargs["json"] for call in mock_client_instance.post.call_args_list]
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+    @patch('main.httpx.AsyncClient')
+    def test_import_csv_reports_invalid_rows(self, mock_client):
+        mock_client_instance = mock_import_client(mock_client)
+        body = "title,user_id,completed\nBuy milk,user-123,true\n   ,user-123,false\nNo owner,,false\n"
+        
+        response = client.post(
+            "/admin/tasks/import?format=csv",
+            content=body,
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}", "Import-Id": "import-1"}
+        )
+        
+        data = response.json()
+        assert data["id"] == "import-1"
+        assert data["rows"] == 3
+        assert data["inserted"] == 1
+        assert data["errors"] == [
+            {"row": 2, "error": "Title is required"},
+            {"row": 3, "error": "user_id is required"}
+        ]
+        [record] = mock_client_instance.post.call_args.kwargs["json"]
+        assert {k: record[k] for k in ("title", "completed", "user_id")} == {
+            "title": "Buy milk", "completed": True, "user_id": "user-123"
+        }
+        assert datetime.fromisoformat(record["completed_at"]) > datetime.now(timezone.utc) - timedelta(minutes=1)
+
+    @patch('main.httpx.AsyncClient')
+    def test_import_keeps_completion_time(self, mock_client):
+        mock_client_instance = mock_import_client(mock_client)
+        body = "\n".join([
+            json.dumps({"title": "Done", "user_id": "user-123", "completed": True, "completed_at": "2020-01-01T00:00:00+00:00"}),
+            json.dumps({"title": "Open", "user_id": "user-123", "completed_at": "2020-01-01T00:00:00+00:00"})
+        ])
+        
+        response = client.post(
+            "/admin/tasks/import",
+            content=body,
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        )
+        
+        records = mock_client_instance.post.call_args.kwargs["json"]
+        assert response.status_code == 200
+        assert "completed_at" in mock_client_instance.post.call_args.args[0]
+        assert records[0]["completed_at"] == "2020-01-01T00:00:00+00:00"
+        assert "completed_at" not in records[1]
+
+    @patch('main.httpx.AsyncClient')
+    def test_import_failed_chunk_reported_per_row(self, mock_client):
+        mock_import_client(mock_client, status_code=400)
+        body = "\n".join([json.dumps({"title": "Task", "user_id": "user-123"}), "not json"])
+        
+        response = client.post(
+            "/admin/tasks/import",
+            content=body,
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        )
+        
+        data = response.json()
+        assert data["inserted"] == 0
+        assert [error["row"] for error in data["errors"]] == [2, 1]
+
+    @patch('main.httpx.AsyncClient')
+    def test_import_bisects_rejected_chunk(self, mock_client):
+        mock_client_instance = mock_import_client(mock_client)
+        
+        async def insert(url, headers, json):
+            if any(record["user_id"] == "ghost" for record in json):
+                return httpx.Response(409, json={"code": "23503", "message": "violates foreign key constraint"})
+            return httpx.Response(201)
+        
+        mock_client_instance.post = AsyncMock(side_effect=insert)
+        owners = ["user-123"] * 5 + ["ghost"] + ["user-123"] * 2
+        body = "\n".join(json.dumps({"title": f"Task {i}", "user_id": owner}) for i, owner in enumerate(owners))
+        
+        response = client.post(
+            "/admin/tasks/import",
+            content=body,
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        )
+        
+        data = response.json()
+        assert data["inserted"] == 7
+        assert data["errors"] == [{"row": 6, "error": "Failed to insert row: violates foreign key constraint"}]
+        assert mock_client_instance.post.call_count < len(owners)
+
+    @patch('main.httpx.AsyncClient')
+    def test_import_malformed_rows_reported_not_fatal(self, mock_client):
+        mock_client_instance = mock_import_client(mock_client)
+        body = b"\n".join([
+            json.dumps({"title": "Good", "user_id": "user-123", "created_at": "2025-01-15T10:00:00+00:00"}).encode(),
+            b'{"title": "Bad bytes \xff", "user_id": "user-123"}',
+            json.dumps({"title": "Numeric owner", "user_id": 123}).encode(),
+            json.dumps({"title": "Bad date", "user_id": "user-123", "created_at": "garbage"}).encode()
+        ])
+        
+        response = client.post(
+            "/admin/tasks/import",
+            content=body,
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        )
+        
+        data = response.json()
+        assert response.status_code == 200
+        assert data["status"] == "done"
+        assert data["inserted"] == 1
+        assert data["errors"] == [
+            {"row": 2, "error": "Row is not valid UTF-8"},
+            {"row": 3, "error": "user_id must be a string"},
+            {"row": 4, "error": "created_at must be an ISO 8601 timestamp"}
+        ]
+        assert mock_client_instance.post.call_args.kwargs["json"][0]["created_at"] == "2025-01-15T10:00:00+00:00"
+
+    @patch('main.httpx.AsyncClient')
+    def test_import_unreadable_header_marks_job_failed(self, mock_client):
+        mock_import_client(mock_client)
+        headers = {"Authorization": f"Bearer {ADMIN_TOKEN}", "Import-Id": "import-3"}
+        
+        response = client.post("/admin/tasks/import?format=csv", content=b"title,\xff\nTask,user-123\n", headers=headers)
+        job = client.get("/admin/tasks/import/import-3", headers=headers)
+        
+        assert response.status_code == 400
+        assert job.json()["status"] == "failed"
+        assert job.json()["error"] == "CSV header is not valid UTF-8"
+
+    @patch('main.httpx.AsyncClient')
+    def test_import_progress_can_be_polled(self, mock_client):
+        mock_import_client(mock_client)
+        headers = {"Authorization": f"Bearer {ADMIN_TOKEN}", "Import-Id": "import-2"}
+        client.post("/admin/tasks/import", content=json.dumps({"title": "Task", "user_id": "user-123"}), headers=headers)
+        
+        response = client.get("/admin/tasks/import/import-2", headers=headers)
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "done"
+
+    def test_import_user_role_forbidden(self):
+        response = client.post("/admin/tasks/import", content="", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+        
+        assert response.status_code == 403
+
+
+class TestProfiling:
+
+    def test_admin_request_is_profiled(self, tmp_path):
+        with patch('main.PROFILE_DIR', str(tmp_path)):
+            response = client.get(
+                "/health/live",
+                headers={"Authorization": f"Bearer {ADMIN_TOKEN}", "X-Profile": "1"}
+            )
+            profile_id = response.headers["X-Profile-Id"]
+            
+            profile = client.get(
+                f"/admin/profiles/{profile_id}",
+                headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+            )
+        
+        assert response.status_code == 200
+        assert profile.status_code == 200
+        assert "function calls" in profile.text
+
+    def test_user_request_is_not_profiled(self, tmp_path):
+        with patch('main.PROFILE_DIR', str(tmp_path)):
+            response = client.get(
+                "/health/live",
+                headers={"Authorization": f"Bearer {USER_TOKEN}", "X-Profile": "1"}
+            )
+        
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+        assert os.listdir(tmp_path) == []
+
+    def test_profile_ring_is_bounded(self, tmp_path):
+        headers = {"Authorization": f"Bearer {ADMIN_TOKEN}", "X-Profile": "1"}
+        with patch('main.PROFILE_DIR', str(tmp_path)), patch('main.PROFILE_RING_SIZE', 2):
+            profile_ids = [client.get("/health/live", headers=headers).headers["X-Profile-Id"] for _ in range(3)]
+            oldest = client.get(
+                f"/admin/profiles/{profile_ids[0]}",
+                headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+            )
+        
+        assert len(os.listdir(tmp_path)) == 2
+        assert oldest.status_code == 404
+
+    def test_profile_excludes_interleaved_requests(self, tmp_path):
+        def profiled_marker():
+            return None
+        
+        def unprofiled_marker():
+            return None
+        
+        async def inner_app(scope, receive, send):
+            for _ in range(5):
+                if scope["path"] == "/profiled":
+                    profiled_marker()
+                else:
+                    unprofiled_marker()
+                await asyncio.sleep(0)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+        
+        middleware = main.ProfilingMiddleware(inner_app)
+        sent = []
+        
+        async def send(message):
+            sent.append(message)
+        
+        def scope(path, headers):
+            return {"type": "http", "method": "GET", "path": path, "headers": headers}
+        
+        async def scenario():
+            await asyncio.gather(
+                middleware(scope("/profiled", [(b"authorization", f"Bearer {ADMIN_TOKEN}".encode()), (b"x-profile", b"1")]), None, send),
+                middleware(scope("/other", []), None, send)
+            )
+        
+        with patch('main.PROFILE_DIR', str(tmp_path)):
+            asyncio.run(scenario())
+        
+        import pstats
+        stats = pstats.Stats(str(next(tmp_path.iterdir()))).stats
+        functions = {name for _, _, name in stats}
+        assert "profiled_marker" in functions
+        assert "unprofiled_marker" not in functions
+
+    def test_get_profile_user_role_forbidden(self):
+        response = client.get(
+            f"/admin/profiles/{'0' * 32}",
+            headers={"Authorization": f"Bearer {USER_TOKEN}"}
+        )
+        
+        assert response.status_code == 403
+
+
+class TestServerTiming:
+
+    @patch('main.httpx.AsyncClient')
+    def test_update_task_timing_breakdown(self, mock_client):
+        task = {"id": "task-123", "title": "Mine", "completed": False, "user_id": "user-123"}
+        mock_get_response = MagicMock()
+        mock_get_response.status_code = 200
+        mock_get_response.json.return_value = [task]
+        
+        mock_patch_response = MagicMock()
+        mock_patch_response.status_code = 200
+        mock_patch_response.json.return_value = [{**task, "completed": True}]
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(return_value=mock_get_response)
+        mock_client_instance.patch = AsyncMock(return_value=mock_patch_response)
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        
+        response = client.patch(
+            "/tasks/task-123",
+            json={"completed": True},
+            headers={"Authorization": f"Bearer {USER_TOKEN}"}
+        )
+        
+        names = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+        assert response.status_code == 200
+        assert names == ["auth", "check", "patch", "serialize", "total"]
+
+    def test_spans_exported_to_file(self, tmp_path):
+        export_file = tmp_path / "spans.jsonl"
+        with patch('main.OTEL_EXPORT_FILE', str(export_file)), TestClient(app) as live_client:
+            live_client.get("/health/live")
+            live_client.get("/health/live")
+        
+        lines = export_file.read_text().splitlines()
+        spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert len(lines) == 2
+        assert spans[0]["name"] == "GET /health/live"
+        assert spans[0]["kind"] == main.SPAN_KIND_SERVER
+        assert spans[1]["name"] == "serialize"
+        assert spans[1]["kind"] == main.SPAN_KIND_INTERNAL
+        assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+
+    @patch('main.httpx.AsyncClient')
+    def test_upstream_spans_are_client_kind(self, mock_client):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = []
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        
+        with patch('main.export_spans') as export, patch('main.OTEL_EXPORT_FILE', "unused.jsonl"):
+            client.get("/tasks", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+        
+        kinds = {child["name"]: child["kind"] for child in export.call_args.args[3]}
+        assert kinds == {"auth": main.SPAN_KIND_INTERNAL, "fetch": main.SPAN_KIND_CLIENT, "serialize": main.SPAN_KIND_INTERNAL}
+
+    @patch('main.httpx.AsyncClient')
+    def test_spans_exported_to_collector(self, mock_client):
+        mock_client_instance = AsyncMock()
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+
+        with patch('main.OTEL_EXPORTER_OTLP_ENDPOINT', "http://collector:4318"), TestClient(app) as live_client:
+            response = live_client.get("/health/live")
+            for _ in range(50):
+                if mock_client_instance.post.await_count:
+                    break
+                time.sleep(0.01)
+
+        assert response.status_code == 200
+        url = mock_client_instance.post.call_args.args[0]
+        spans = mock_client_instance.post.call_args.kwargs["json"]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert url == "http://collector:4318/v1/traces"
+        assert spans[0]["name"] == "GET /health/live"
+        assert not main.span_export_tasks
+
+
+class TestAdmissionControl:
+
+    def test_waiters_admitted_by_priority(self):
+        controller = main.AdmissionController(limit=1, max_queue=10, timeout=1)
+        order = []
+        
+        async def request(priority):
+            assert await controller.acquire(priority)
+            order.append(priority)
+            await asyncio.sleep(0)
+            controller.release(priority, 0.001)
+        
+        async def scenario():
+            await controller.acquire(1)
+            waiters = [asyncio.create_task(request(p)) for p in (3, 2, 0, 1)]
+            await asyncio.sleep(0)
+            controller.release(1, 0.001)
+            await asyncio.gather(*waiters)
+        
+        asyncio.run(scenario())
+        
+        assert order == [0, 1, 2, 3]
+
+    def test_rejects_when_queue_full(self):
+        controller = main.AdmissionController(limit=1, max_queue=1, timeout=1)
+        
+        async def scenario():
+            await controller.acquire(1)
+            waiter = asyncio.create_task(controller.acquire(1))
+            await asyncio.sleep(0)
+            rejected = await controller.acquire(2)
+            controller.release(1, 0.001)
+            return rejected, await waiter
+        
+        rejected, admitted = asyncio.run(scenario())
+        
+        assert rejected is False
+        assert admitted is True
+        assert controller.metrics()["rejected"]["write"] == 1
+
+    def test_health_evicts_lower_class_from_full_queue(self):
+        controller = main.AdmissionController(limit=2, max_queue=2, timeout=1)
+        
+        async def scenario():
+            await controller.acquire(2)
+            await controller.acquire(2)
+            writes = [asyncio.create_task(controller.acquire(2)) for _ in range(2)]
+            await asyncio.sleep(0)
+            health = asyncio.create_task(controller.acquire(0))
+            await asyncio.sleep(0)
+            controller.release(2, 0.001)
+            admitted = await health
+            controller.release(2, 0.001)
+            return admitted, await asyncio.gather(*writes)
+        
+        health, writes = asyncio.run(scenario())
+        
+        assert health is True
+        assert sorted(writes) == [False, True]
+        assert controller.metrics()["rejected"] == {"health": 0, "read": 0, "write": 1, "admin": 0}
+        assert controller.queued == 0
+
+    def test_wait_estimate_ignores_lower_classes(self):
+        controller = main.AdmissionController(limit=1, max_queue=100, timeout=5)
+        controller.service_times = [1.0] * len(main.PRIORITY_CLASSES)
+        
+        async def scenario():
+            await controller.acquire(3)
+            admins = [asyncio.create_task(controller.acquire(3)) for _ in range(10)]
+            await asyncio.sleep(0)
+            health = asyncio.create_task(controller.acquire(0))
+            late_admin = await controller.acquire(3)
+            await asyncio.sleep(0)
+            controller.release(3, 0.001)
+            admitted = await health
+            for task in admins:
+                task.cancel()
+            await asyncio.gather(*admins, return_exceptions=True)
+            return admitted, late_admin
+        
+        health, late_admin = asyncio.run(scenario())
+        
+        assert health is True
+        assert late_admin is False
+
+    def test_request_over_wait_estimate_evicts_nobody(self):
+        controller = main.AdmissionController(limit=1, max_queue=4, timeout=1)
+        controller.service_times = [0.3] * len(main.PRIORITY_CLASSES)
+        
+        async def scenario():
+            await controller.acquire(1)
+            waiters = [asyncio.create_task(controller.acquire(p)) for p in (3, 1, 1, 1)]
+            await asyncio.sleep(0)
+            admitted = await controller.acquire(1)
+            queued, rejected = controller.queued, dict(controller.rejected)
+            for task in waiters:
+                task.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            return admitted, queued, rejected
+        
+        admitted, queued, rejected = asyncio.run(scenario())
+        
+        assert admitted is False
+        assert queued == 4
+        assert rejected == {"health": 0, "read": 1, "write": 0, "admin": 0}
+
+    def test_slow_admin_requests_do_not_inflate_read_estimate(self):
+        controller = main.AdmissionController(limit=1, max_queue=10, timeout=1)
+        controller.active = 2
+        controller.release(1, 0.01)
+        controller.release(3, 30.0)
+        
+        assert controller.estimated_wait(1) == pytest.approx(0.01)
+        assert controller.estimated_wait(3) == pytest.approx(30.0)
+
+    def test_rejects_after_queue_timeout(self):
+        controller = main.AdmissionController(limit=1, max_queue=10, timeout=0.01)
+        
+        async def scenario():
+            await controller.acquire(1)
+            return await controller.acquire(1)
+        
+        assert asyncio.run(scenario()) is False
+        assert controller.queued == 0
+
+    def test_overloaded_request_gets_503(self):
+        with patch.object(main.admission, "active", main.admission.limit), patch.object(main.admission, "max_queue", 0):
+            response = client.get("/health/live")
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert response.json()["detail"]["error"] == "Server overloaded"
+
+    def test_admission_metrics_admin(self):
+        response = client.get("/admin/admission", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+        
+        assert response.status_code == 200
+        assert response.json()["limit"] == main.MAX_CONCURRENCY
+        assert "queued" in response.json()
+
+    def test_admission_metrics_user_role_forbidden(self):
+        response = client.get("/admin/admission", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+        
+        assert response.status_code == 403
+
+
+def split_filters(expression):
+    """Splits a PostgREST logic list on its top-level commas."""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(expression):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if char == "," and depth == 0:
+            parts.append(expression[start:i])
+            start = i + 1
+    return parts + [expression[start:]]
+
+
+class FakePostgrest:
+    """In-memory stand-in for one shard's PostgREST tasks endpoint."""
+
+    def __init__(self, rows=None):
+        self.rows = list(rows or [])
+
+    def satisfies(self, row, expression):
+        if expression.startswith(("and(", "or(")):
+            operator, _, inner = expression.partition("(")
+            results = [self.satisfies(row, part) for part in split_filters(inner[:-1])]
+            return all(results) if operator == "and" else any(results)
+        column, _, condition = expression.partition(".")
+        return self.matches(row, {column: condition})
+
+    def matches(self, row, params):
+        for column, condition in params.items():
+            if column in ("select", "order", "limit", "on_conflict", "columns"):
+                continue
+            if column in ("and", "or"):
+                if not self.satisfies(row, f"{column}{condition}"):
+                    return False
+                continue
+            op, _, value = condition.partition(".")
+            if op == "eq" and str(row.get(column)) != value:
+                return False
+            if op == "gt" and not str(row.get(column)) > value:
+                return False
+            if op == "in" and str(row.get(column)) not in value.strip("()").split(","):
+                return False
+            if op == "ov" and not set(value.strip("{}").split(",")) & set(row.get(column) or []):
+                return False
+            if op == "cs" and not set(value.strip("{}").split(",")) <= set(row.get(column) or []):
+                return False
+        return True
+
+    def handle(self, request):
+        params = dict(request.url.params)
+        selected = [row for row in self.rows if self.matches(row, params)]
+        
+        if request.method == "GET":
+            for order in reversed(params.get("order", "id.asc").split(",")):
+                column, _, direction = order.partition(".")
+                selected.sort(key=lambda row: row.get(column) or "", reverse=direction == "desc")
+            if "limit" in params:
+                selected = selected[:int(params["limit"])]
+            return httpx.Response(200, json=selected)
+        
+        if request.method == "POST":
+            body = json.loads(request.content)
+            new_rows = body if isinstance(body, list) else [body]
+            existing = {row["id"] for row in self.rows}
+            for row in new_rows:
+                row.setdefault("id", f"task-{uuid.uuid4().hex[:8]}")
+                row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+                if row["id"] not in existing:
+                    self.rows.append(dict(row))
+            return httpx.Response(201, json=new_rows)
+        
+        if request.method == "PATCH":
+            for row in selected:
+                row.update(json.loads(request.content))
+            return httpx.Response(200, json=selected)
+        
+        if request.method == "DELETE":
+            self.rows = [row for row in self.rows if row not in selected]
+            return httpx.Response(204)
+
+
+class TestSharding:
+
+    SHARDS = [
+        {"name": name, "url": f"http://shard-{name}.test", "key": "test-key", "service_key": "test-service-role-key"}
+        for name in ("a", "b", "c")
+    ]
+
+    def stand_ins(self, ring, rows_by_shard=None, archived_by_shard=None):
+        servers = {shard["name"]: FakePostgrest((rows_by_shard or {}).get(shard["name"])) for shard in ring.shards}
+        for name, server in servers.items():
+            server.archive = FakePostgrest((archived_by_shard or {}).get(name))
+        hosts = {f"shard-{name}.test": server for name, server in servers.items()}
+        
+        def handle(request):
+            if request.url.path.startswith("/auth/"):
+                return httpx.Response(204)
+            server = hosts[request.url.host]
+            return (server.archive if request.url.path.endswith("/tasks_archive") else server).handle(request)
+        
+        transport = httpx.MockTransport(handle)
+        return servers, lambda *args, **kwargs: RealAsyncClient(transport=transport)
+
+    def test_ring_is_deterministic_and_balanced(self):
+        ring = main.HashRing(self.SHARDS)
+        owners = [ring.shard_for(f"user-{i}")["name"] for i in range(3000)]
+        
+        assert owners == [main.HashRing(self.SHARDS).shard_for(f"user-{i}")["name"] for i in range(3000)]
+        assert all(600 < owners.count(name) < 1400 for name in ("a", "b", "c"))
+
+    def test_adding_shard_only_moves_keys_to_new_shard(self):
+        before = main.HashRing(self.SHARDS)
+        after = main.HashRing(self.SHARDS + [{"name": "d", "url": "http://shard-d.test", "key": "k", "service_key": "k"}])
+        
+        moved = [i for i in range(3000) if before.shard_for(f"user-{i}")["name"] != after.shard_for(f"user-{i}")["name"]]
+        
+        assert all(after.shard_for(f"user-{i}")["name"] == "d" for i in moved)
+        assert 400 < len(moved) < 1200
+
+    def test_user_tasks_routed_to_owner_shard(self):
+        ring = main.HashRing(self.SHARDS)
+        servers, client_factory = self.stand_ins(ring)
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        
+        owner = ring.shard_for("user-123")["name"]
+        
+        with patch('main.shard_ring', ring), patch('main.httpx.AsyncClient', client_factory):
+            created = client.post("/tasks", json={"title": "Sharded"}, headers=headers)
+            stored = {name: len(server.rows) for name, server in servers.items()}
+            listed = client.get("/tasks", headers=headers)
+            updated = client.patch(f"/tasks/{created.json()['id']}", json={"completed": True}, headers=headers)
+            deleted = client.delete(f"/tasks/{created.json()['id']}", headers=headers)
+        
+        assert created.status_code == 201
+        assert stored == {name: int(name == owner) for name in servers}
+        assert [task["title"] for task in listed.json()] == ["Sharded"]
+        assert updated.json()["completed"] is True
+        assert deleted.status_code == 204
+        assert all(server.rows == [] for server in servers.values())
+
+    def test_admin_fan_out_merges_shards(self):
+        ring = main.HashRing(self.SHARDS)
+        rows = {
+            "a": [{"id": "t1", "title": "Oldest", "user_id": "u1", "created_at": "2025-01-01T00:00:00Z"}],
+            "b": [{"id": "t3", "title": "Newest", "user_id": "u2", "created_at": "2025-01-03T00:00:00Z"}],
+            "c": [{"id": "t2", "title": "Middle", "user_id": "u3", "created_at": "2025-01-02T00:00:00Z"}]
+        }
+        servers, client_factory = self.stand_ins(ring, rows)
+        headers = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        
+        with patch('main.shard_ring', ring), patch('main.httpx.AsyncClient', client_factory):
+            listed = client.get("/tasks", headers=headers)
+            updated = client.patch("/tasks/t2", json={"title": "Renamed"}, headers=headers)
+        
+        assert [task["title"] for task in listed.json()] == ["Newest", "Middle", "Oldest"]
+        assert updated.status_code == 200
+        assert servers["c"].rows[0]["title"] == "Renamed"
+
+    def test_rebalance_moves_misplaced_tasks(self):
+        ring = main.HashRing(self.SHARDS)
+        user_ids = [f"user-{i}" for i in range(30)]
+        # Everything starts on shard "a", as if b and c were just added
+        rows = {"a": [{"id": f"t{i:02d}", "title": "Task", "user_id": user_id} for i, user_id in enumerate(user_ids)]}
+        archived = {"a": [{"id": f"a{i:02d}", "title": "Done", "user_id": user_id} for i, user_id in enumerate(user_ids)]}
+        servers, client_factory = self.stand_ins(ring, rows, archived)
+        
+        with patch('main.shard_ring', ring), patch('main.httpx.AsyncClient', client_factory), \
+                patch('main.REBALANCE_PAGE_SIZE', 7):
+            planned = asyncio.run(main.rebalance_shards(dry_run=True))
+            moved = asyncio.run(main.rebalance_shards())
+            again = asyncio.run(main.rebalance_shards())
+        
+        assert planned == moved
+        assert again == {}
+        assert set(moved) == {f"{table}:a->{name}" for table in ("tasks", "tasks_archive") for name in ("b", "c")}
+        for name, server in servers.items():
+            assert all(ring.shard_for(row["user_id"])["name"] == name for row in server.rows + server.archive.rows)
+        assert sum(len(server.rows) for server in servers.values()) == 30
+        assert sum(len(server.archive.rows) for server in servers.values()) == 30
+
+    def test_sharded_directory_counts_through_rpc(self):
+        ring = main.HashRing(self.SHARDS)
+        counts = {"a": [{"user_id": "user-1", "task_count": 2}], "b": [{"user_id": "user-1", "task_count": 3}], "c": []}
+        requests = []
+        
+        def handle(request):
+            requests.append(request)
+            return httpx.Response(200, json=counts[request.url.host.split("-")[1].split(".")[0]])
+        
+        transport = httpx.MockTransport(handle)
+        
+        async def scenario():
+            async with RealAsyncClient(transport=transport) as http:
+                return await main.count_sharded_tasks(http)
+        
+        with patch('main.shard_ring', ring):
+            totals = asyncio.run(scenario())
+        
+        assert totals == {"user-1": 5}
+        assert {(request.method, request.url.path) for request in requests} == {("POST", "/rest/v1/rpc/task_counts_by_user")}
+
+    def test_delete_user_removes_rows_on_owner_shard(self):
+        ring = main.HashRing(self.SHARDS)
+        owner = ring.shard_for("user-1")["name"]
+        rows = {owner: [{"id": "t1", "title": "Task", "user_id": "user-1"}, {"id": "t2", "title": "Task", "user_id": "user-2"}]}
+        archived = {owner: [{"id": "a1", "title": "Done", "user_id": "user-1"}]}
+        servers, client_factory = self.stand_ins(ring, rows, archived)
+        main.user_directory_cache.set("directory", {"loaded_at": time.monotonic(), "by_id": {"user-1": {}}})
+        
+        with patch('main.shard_ring', ring), patch('main.httpx.AsyncClient', client_factory), \
+                patch('main.SUPABASE_URL', f"http://shard-{owner}.test"):
+            response = client.delete("/admin/users/user-1", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+        
+        assert response.status_code == 204
+        assert [row["id"] for row in servers[owner].rows] == ["t2"]
+        assert servers[owner].archive.rows == []
+
+
+class TestTaskTags:
+
+    SHARD = {"name": "a", "url": "http://shard-a.test", "key": "test-key", "service_key": "test-service-role-key"}
+
+    def stand_in(self, rows=(), counts=()):
+        tables = {"tasks": FakePostgrest([dict(row) for row in rows]), "task_tag_counts": FakePostgrest(counts)}
+        requests = []
+        
+        def handle(request):
+            requests.append(request)
+            return tables[request.url.path.rsplit("/", 1)[-1]].handle(request)
+        
+        transport = httpx.MockTransport(handle)
+        return tables, requests, lambda *args, **kwargs: RealAsyncClient(transport=transport)
+
+    def tagged_rows(self):
+        return [
+            {"id": "t1", "user_id": "user-123", "title": "Both", "tags": ["home", "urgent"], "created_at": "2025-01-03"},
+            {"id": "t2", "user_id": "user-123", "title": "Home", "tags": ["home"], "created_at": "2025-01-02"},
+            {"id": "t3", "user_id": "user-123", "title": "None", "tags": [], "created_at": "2025-01-01"}
+        ]
+
+    def test_create_normalizes_tags(self):
+        tables, _, client_factory = self.stand_in()
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            response = client.post(
+                "/tasks",
+                json={"title": "Tagged", "tags": [" Home", "home", "URGENT"]},
+                headers={"Authorization": f"Bearer {USER_TOKEN}"}
+            )
+        
+        assert response.status_code == 201
+        assert tables["tasks"].rows[0]["tags"] == ["home", "urgent"]
+
+    def test_invalid_tags_rejected(self):
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        
+        bad_characters = client.post("/tasks", json={"title": "Tagged", "tags": ["a,b"]}, headers=headers)
+        too_many = client.patch("/tasks/t1", json={"tags": [f"tag{i}" for i in range(21)]}, headers=headers)
+        bad_filter = client.get("/tasks", params={"tag": "{x}"}, headers=headers)
+        
+        assert bad_characters.status_code == 422
+        assert too_many.status_code == 422
+        assert bad_filter.status_code == 400
+
+    def test_filter_pushed_down_with_any_and_all(self):
+        _, requests, client_factory = self.stand_in(self.tagged_rows())
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            any_match = client.get("/tasks", params=[("tag", "urgent"), ("tag", "home")], headers=headers)
+            all_match = client.get("/tasks", params=[("tag", "urgent"), ("tag", "home"), ("match", "all")], headers=headers)
+        
+        assert [task["id"] for task in any_match.json()] == ["t1", "t2"]
+        assert [task["id"] for task in all_match.json()] == ["t1"]
+        assert [request.url.params["tags"] for request in requests] == ["ov.{home,urgent}", "cs.{home,urgent}"]
+
+    def test_filter_served_from_cached_full_list(self):
+        _, requests, client_factory = self.stand_in(self.tagged_rows())
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            client.get("/tasks", headers=headers)
+            filtered = client.get("/tasks", params={"tag": "home"}, headers=headers)
+        
+        assert [task["id"] for task in filtered.json()] == ["t1", "t2"]
+        assert len(requests) == 1
+
+    def test_tag_counts_cached_until_tasks_change(self):
+        counts = [
+            {"user_id": "user-123", "tag": "home", "task_count": 2},
+            {"user_id": "user-123", "tag": "urgent", "task_count": 1},
+            {"user_id": "user-123", "tag": "old", "task_count": 0},
+            {"user_id": "other-user", "tag": "work", "task_count": 5}
+        ]
+        _, requests, client_factory = self.stand_in(self.tagged_rows(), counts)
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            first = client.get("/tasks/tags", headers=headers)
+            client.get("/tasks/tags", headers=headers)
+            client.patch("/tasks/t3", json={"tags": ["home"]}, headers=headers)
+            client.get("/tasks/tags", headers=headers)
+        
+        assert first.status_code == 200
+        assert first.json() == [{"tag": "home", "count": 2}, {"tag": "urgent", "count": 1}]
+        assert [request.url.path.rsplit("/", 1)[-1] for request in requests] == [
+            "task_tag_counts", "tasks", "tasks", "task_tag_counts"
+        ]
+
+
+class TestGetTask:
+
+    SHARD = {"name": "a", "url": "http://shard-a.test", "key": "test-key", "service_key": "test-service-role-key"}
+    ROWS = [
+        {"id": "t1", "user_id": "user-123", "title": "Mine", "completed": False, "position": "V"},
+        {"id": "t2", "user_id": "other-user", "title": "Theirs", "completed": False, "position": "V"}
+    ]
+
+    def stand_in(self):
+        server = FakePostgrest([dict(row) for row in self.ROWS])
+        requests = []
+        
+        def handle(request):
+            requests.append(request)
+            return server.handle(request)
+        
+        transport = httpx.MockTransport(handle)
+        return requests, lambda *args, **kwargs: RealAsyncClient(transport=transport)
+
+    def test_get_own_task_then_served_from_cache(self):
+        requests, client_factory = self.stand_in()
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            first = client.get("/tasks/t1", headers=headers)
+            second = client.get("/tasks/t1", headers=headers)
+        
+        assert first.status_code == 200
+        assert first.json()["title"] == "Mine"
+        assert second.json() == first.json()
+        assert len(requests) == 1
+
+    def test_other_users_task_forbidden(self):
+        _, client_factory = self.stand_in()
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            response = client.get("/tasks/t2", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+        
+        assert response.status_code == 403
+
+    def test_non_owner_gets_not_found_from_warm_cache(self):
+        _, client_factory = self.stand_in()
+        other_token = create_test_token("other-user", "other@example.com", "user")
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            owner = client.get("/tasks/t1", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+            shown = client.get("/tasks/t1", headers={"Authorization": f"Bearer {other_token}"})
+            deleted = client.delete("/tasks/t1", headers={"Authorization": f"Bearer {other_token}"})
+        
+        assert owner.status_code == 200
+        assert shown.status_code == 404
+        assert deleted.status_code == 404
+
+    def test_missing_task_not_found(self):
+        _, client_factory = self.stand_in()
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            response = client.get("/tasks/missing", headers={"Authorization": f"Bearer {USER_TOKEN}"})
+        
+        assert response.status_code == 404
+
+    def test_if_none_match_returns_not_modified(self):
+        _, client_factory = self.stand_in()
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            first = client.get("/tasks/t1", headers=headers)
+            cached = client.get("/tasks/t1", headers={**headers, "If-None-Match": first.headers["ETag"]})
+            client.patch("/tasks/t1", json={"title": "Renamed"}, headers=headers)
+            changed = client.get("/tasks/t1", headers={**headers, "If-None-Match": first.headers["ETag"]})
+        
+        assert cached.status_code == 304
+        assert cached.headers["ETag"] == first.headers["ETag"]
+        assert changed.status_code == 200
+        assert changed.json()["title"] == "Renamed"
+        assert changed.headers["ETag"] != first.headers["ETag"]
+
+    def test_mutations_reuse_cached_row(self):
+        requests, client_factory = self.stand_in()
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            client.get("/tasks/t1", headers=headers)
+            client.patch("/tasks/t1", json={"completed": True}, headers=headers)
+            shown = client.get("/tasks/t1", headers=headers)
+            deleted = client.delete("/tasks/t1", headers=headers)
+            gone = client.get("/tasks/t1", headers=headers)
+        
+        assert [request.method for request in requests] == ["GET", "PATCH", "DELETE", "GET"]
+        assert shown.json()["completed"] is True
+        assert deleted.status_code == 204
+        assert gone.status_code == 404
+
+
+class TestTaskPositions:
+
+    SHARD = {"name": "a", "url": "http://shard-a.test", "key": "test-key", "service_key": "test-service-role-key"}
+
+    def stand_in(self, rows):
+        server = FakePostgrest(rows)
+        server.requests = []
+        
+        def handle(request):
+            server.requests.append(request)
+            if request.url.path.endswith("/rpc/move_task_positions"):
+                moved = []
+                for move in json.loads(request.content)["moves"]:
+                    for row in server.rows:
+                        if row["id"] == move["id"] and row["position"] == move["old_position"]:
+                            row["position"] = move["new_position"]
+                            moved.append({"id": row["id"]})
+                return httpx.Response(200, json=moved)
+            return server.handle(request)
+        
+        transport = httpx.MockTransport(handle)
+        return server, lambda *args, **kwargs: RealAsyncClient(transport=transport)
+
+    def test_rank_between_sorts_strictly_between(self):
+        import random
+        rng = random.Random(7)
+        keys = [main.rank_between(None, None)]
+        for _ in range(500):
+            i = rng.randint(0, len(keys))
+            before = keys[i - 1] if i > 0 else None
+            after = keys[i] if i < len(keys) else None
+            key = main.rank_between(before, after)
+            assert (before is None or before < key) and (after is None or key < after)
+            assert not key.endswith("0")
+            keys.insert(i, key)
+        
+        assert keys == sorted(keys)
+
+    def test_repeated_moves_to_the_ends_grow_keys_slowly(self):
+        top = bottom = main.rank_between(None, None)
+        for _ in range(300):
+            top = main.rank_between(None, top)
+            bottom = main.rank_between(bottom, None)
+        
+        assert len(top) <= 7
+        assert len(bottom) <= 7
+
+    def test_rank_between_rejects_inverted_neighbours(self):
+        with pytest.raises(ValueError):
+            main.rank_between("b", "a")
+
+    def test_spread_ranks_are_short_and_ordered(self):
+        keys = main.spread_ranks(1000)
+        
+        assert keys == sorted(keys)
+        assert len(set(keys)) == 1000
+        assert max(len(key) for key in keys) <= 3
+        assert not any(key.endswith("0") for key in keys)
+
+    def test_move_patches_only_the_moved_task(self):
+        rows = [
+            {"id": "t1", "user_id": "user-123", "title": "One", "position": "A", "created_at": "2025-01-01"},
+            {"id": "t2", "user_id": "user-123", "title": "Two", "position": "B", "created_at": "2025-01-02"},
+            {"id": "t3", "user_id": "user-123", "title": "Three", "position": "C", "created_at": "2025-01-03"}
+        ]
+        server, client_factory = self.stand_in(rows)
+        headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            moved = client.patch("/tasks/t3", json={"after_position": "A", "before_position": "B"}, headers=headers)
+            listed = client.get("/tasks", params={"sort": "position"}, headers=headers)
+        
+        assert moved.status_code == 200
+        assert "A" < moved.json()["position"] < "B"
+        assert [row["position"] for row in server.rows[:2]] == ["A", "B"]
+        assert [task["id"] for task in listed.json()] == ["t1", "t3", "t2"]
+
+    def test_move_with_inverted_neighbours_rejected(self):
+        rows = [{"id": "t1", "user_id": "user-123", "title": "One", "position": "A"}]
+        _, client_factory = self.stand_in(rows)
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            response = client.patch(
+                "/tasks/t1",
+                json={"after_position": "C", "before_position": "B"},
+                headers={"Authorization": f"Bearer {USER_TOKEN}"}
+            )
+        
+        assert response.status_code == 400
+
+    def test_invalid_position_key_rejected(self):
+        response = client.patch(
+            "/tasks/t1",
+            json={"after_position": "A0"},
+            headers={"Authorization": f"Bearer {USER_TOKEN}"}
+        )
+        
+        assert response.status_code == 422
+
+    def test_rebalance_respaces_keys_in_order(self):
+        rows = [
+            {"id": f"t{i}", "user_id": "user-123", "position": "V" * (i + 10), "created_at": "2025-01-01"}
+            for i in range(5)
+        ]
+        server, client_factory = self.stand_in(rows)
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            moved = asyncio.run(main.rebalance_positions("user-123"))
+        
+        positions = [row["position"] for row in server.rows]
+        assert moved == 5
+        assert positions == sorted(positions)
+        assert max(len(position) for position in positions) == 2
+
+    @patch('main.RANK_PAGE_SIZE', 2)
+    def test_rebalance_pages_reads_and_batches_writes(self):
+        # Equal keys are ordered by id, so paging must not skip or repeat any of them
+        rows = [
+            {"id": f"t{i}", "user_id": "user-123", "position": "V" * (i // 2 + 10), "created_at": "2025-01-01"}
+            for i in range(5)
+        ]
+        server, client_factory = self.stand_in(rows)
+        
+        with patch('main.shard_ring', main.HashRing([self.SHARD])), patch('main.httpx.AsyncClient', client_factory):
+            moved = asyncio.run(main.rebalance_positions("user-123"))
+        
+        methods = [request.method for request in server.requests]
+        order = [row["id"] for row in sorted(server.rows, key=lambda row: row["position"])]
+        assert moved == 5
+        assert methods == ["GET"] * 3 + ["POST"] * 3
+        assert order == [f"t{i}" for i in range(5)]
+        assert len({row["position"] for row in server.rows}) == 5
+
+
+class TestCompletionAnalytics:
+
+    SHARDS = [
+        {"name": name, "url": f"http://shard-{name}.test", "key": "test-key", "service_key": "test-service-role-key"}
+        for name in ("a", "b")
+    ]
+
+    def stand_in(self, counts_by_shard):
+        requests = []
+        
+        def handle(request):
+            requests.append(request)
+            return httpx.Response(200, json=counts_by_shard.get(request.url.host.split("-")[1].split(".")[0], []))
+        
+        transport = httpx.MockTransport(handle)
+        return requests, lambda *args, **kwargs: RealAsyncClient(transport=transport)
+
+    def get(self, **params):
+        return client.get(
+            "/admin/analytics/completion",
+            params=params,
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        )
+
+    def test_merges_grouped_counts_from_every_shard(self):
+        counts = {
+            "a": [
+                {"user_id": "u1", "period": "2024-01-01", "created": 2, "completed": 1},
+                {"user_id": "u1", "period": "2024-01-02", "created": 0, "completed": 1}
+            ],
+            "b": [
+                {"user_id": "u2", "period": "2024-01-01", "created": 0, "completed": 1},
+                {"user_id": "u2", "period": "2024-01-02", "created": 1, "completed": 0}
+            ]
+        }
+        requests, client_factory = self.stand_in(counts)
+        
+        with patch('main.shard_ring', main.HashRing(self.SHARDS)), patch('main.httpx.AsyncClient', client_factory):
+            response = self.get(bucket="day", start="2024-01-01", end="2024-01-03")
+        
+        assert response.status_code == 200
+        body = response.json()
+        assert body["totals"] == [
+            {"period": "2024-01-01", "created": 2, "completed": 2},
+            {"period": "2024-01-02", "created": 1, "completed": 1}
+        ]
+        assert body["users"] == [
+            {"user_id": "u1", "periods": [
+                {"period": "2024-01-01", "created": 2, "completed": 1},
+                {"period": "2024-01-02", "created": 0, "completed": 1}
+            ]},
+            {"user_id": "u2", "periods": [
+                {"period": "2024-01-01", "created": 0, "completed": 1},
+                {"period": "2024-01-02", "created": 1, "completed": 0}
+            ]}
+        ]
+        assert {request.url.path for request in requests} == {"/rest/v1/rpc/task_completion_counts"}
+        assert [json.loads(request.content) for request in requests] == [
+            {"bucket": "day", "range_start": "2024-01-01", "range_end": "2024-01-03"}
+        ] * 2
+
+    def test_week_range_snaps_to_mondays(self):
+        requests, client_factory = self.stand_in({})
+        
+        with patch('main.shard_ring', main.HashRing(self.SHARDS[:1])), patch('main.httpx.AsyncClient', client_factory):
+            response = self.get(bucket="week", start="2024-01-03", end="2024-01-10")
+        
+        body = response.json()
+        assert (body["start"], body["end"]) == ("2024-01-01", "2024-01-15")
+        assert json.loads(requests[0].content) == {"bucket": "week", "range_start": "2024-01-01", "range_end": "2024-01-15"}
+
+    def test_results_cached_per_bucket_range(self):
+        counts = {"a": [{"user_id": "u1", "period": "2024-01-01", "created": 1, "completed": 0}]}
+        requests, client_factory = self.stand_in(counts)
+        
+        with patch('main.shard_ring', main.HashRing(self.SHARDS[:1])), patch('main.httpx.AsyncClient', client_factory):
+            first = self.get(bucket="day", start="2024-01-01", end="2024-01-02")
+            second = self.get(bucket="day", start="2024-01-01", end="2024-01-02")
+            self.get(bucket="week", start="2024-01-01", end="2024-01-02")
+        
+        assert first.json() == second.json()
+        assert len(requests) == 2
+
+    def test_rejects_empty_range(self):
+        response = self.get(start="2024-01-05", end="2024-01-01")
+        
+        assert response.status_code == 400
+
+    def test_requires_admin(self):
+        response = client.get(
+            "/admin/analytics/completion",
+            headers={"Authorization": f"Bearer {USER_TOKEN}"}
+        )
+        
+        assert response.status_code == 403
+
+
+class TestStartup:
+
+    def run_fresh(self, code: str) -> str:
+        import subprocess
+        import sys
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ}, capture_output=True, text=True
+        )
+        assert result.returncode == 0, result.stderr
+        return result.stdout
+
+    def test_heavy_dependencies_not_loaded_at_import(self):
+        output = self.run_fresh(
+            "import sys, main\n"
+            "print(' '.join(m for m in ('httpx._client', 'jwt.api_jwt', 'cProfile', 'pstats') if m in sys.modules))"
+        )
+        
+        assert output.strip() == ""
+
+    def test_lazy_modules_load_on_first_use(self):
+        output = self.run_fresh(
+            "import sys, main\n"
+            "main.httpx.Timeout(1)\n"
+            "print('httpx._client' in sys.modules)"
+        )
+        
+        assert output.strip() == "True"
+
+    def test_time_to_first_response_within_budget(self):
+        budget_ms = float(os.getenv("STARTUP_BUDGET_MS", "3000"))
+        output = self.run_fresh(
+            "import time\n"
+            "start = time.perf_counter()\n"
+            "import main\n"
+            "from fastapi.testclient import TestClient\n"
+            "response = TestClient(main.app).get('/health/live')\n"
+            "print(response.status_code, (time.perf_counter() - start) * 1000)"
+        )
+        status, elapsed_ms = output.split()
+        
+        assert status == "200"
+        assert float(elapsed_ms) < budget_ms
+
+
 class TestHealthEndpoint:
 
     def test_health_check(self):
@@ -665,6 +2445,55 @@ class TestHealthEndpoint:
         assert data["status"] == "OK"
         assert "timestamp" in data
 
+    def test_health_live(self):
+        response = client.get("/health/live")
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "OK"
+
+    def test_health_ready_before_first_check(self):
+        with patch.dict(main.readiness_state, {"ready": False, "checked_at": None, "checks": {}}):
+            response = client.get("/health/ready")
+        
+        assert response.status_code == 503
+        assert response.json()["status"] == "UNAVAILABLE"
+
+    @patch('main.httpx.AsyncClient')
+    def test_health_ready_after_successful_check(self, mock_client):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        
+        with patch.dict(main.readiness_state):
+            asyncio.run(main.check_upstreams())
+            response = client.get("/health/ready")
+        
+        assert response.status_code == 200
+        assert response.json()["checks"] == {"auth": "OK", "rest": "OK"}
+
+    @patch('main.httpx.AsyncClient')
+    def test_health_ready_upstream_failing(self, mock_client):
+        mock_response = MagicMock()
+        mock_response.status_code = 503
+        
+        mock_client_instance = AsyncMock()
+        mock_client_instance.get = AsyncMock(return_value=mock_response)
+        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
+        mock_client_instance.__aexit__ = AsyncMock(return_value=None)
+        mock_client.return_value = mock_client_instance
+        
+        with patch.dict(main.readiness_state):
+            asyncio.run(main.check_upstreams())
+            response = client.get("/health/ready")
+        
+        assert response.status_code == 503
+        assert response.json()["checks"]["rest"] == "HTTP 503"
+
 
 class TestInvalidEndpoints:
 